@@ -33,10 +33,16 @@ login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
 login_manager.login_message_category = 'info'
 
-# Create tables
+# Fingerprinted static URLs with long-lived caching
+from services.assets import fingerprint_static_urls, send_static_file, compress_static_files
+app.url_defaults(fingerprint_static_urls)
+app.view_functions['static'] = send_static_file
+
+# Create or upgrade tables
 with app.app_context():
     import models  # noqa: F401
-    db.create_all()
+    from migrations import run_migrations
+    run_migrations()
     
     # Check if admin user exists and create if not
     from models import User
@@ -53,12 +59,23 @@ with app.app_context():
         db.session.add(admin)
         db.session.commit()
         logger.info("Admin user created")
+    
+    # Refresh the .gz/.br copies of CSS and JS that changed since the last start
+    try:
+        compress_static_files()
+    except OSError as e:
+        logger.warning(f"Could not precompress static files: {e}")
 
 # Setup user loader for Flask-Login
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+    from services.users import load_user as load_cached_user
+    return load_cached_user(user_id)
+
+@app.context_processor
+def inject_settings():
+    from services.settings import get_settings
+    return {'settings': get_settings()}
 
 @app.errorhandler(404)
 def page_not_found(e):
@@ -86,41 +103,24 @@ app.register_blueprint(admin.bp)
 @login_required
 def index():
     """Main dashboard."""
-    from models import Product, InventoryLog
-    import datetime
+    from models import InventoryLog
+    from services.kpi import get_kpis
+    from services.settings import get_setting
+    from sqlalchemy.orm import joinedload
     
-    # Get product counts
-    total_products = Product.query.count()
-    low_stock_threshold = 10  # This could come from settings
-    low_stock_count = Product.query.filter(Product.quantity <= low_stock_threshold).count()
-    out_of_stock_count = Product.query.filter(Product.quantity <= 0).count()
+    # Product counts, inventory value and today's movements (cached)
+    kpis = get_kpis(get_setting('low_stock_threshold'))
     
     # Get recent inventory activities
-    recent_activities = InventoryLog.query.order_by(InventoryLog.created_at.desc()).limit(5).all()
-    
-    # Get inventory value
-    inventory_value = db.session.query(db.func.sum(Product.price_sell * Product.quantity)).scalar() or 0
-    
-    # Get today's movements
-    today = datetime.datetime.now().date()
-    today_start = datetime.datetime.combine(today, datetime.time.min)
-    today_end = datetime.datetime.combine(today, datetime.time.max)
-    
-    stock_in_today = db.session.query(db.func.sum(InventoryLog.quantity)).filter(
-        InventoryLog.action_type == 'in',
-        InventoryLog.created_at.between(today_start, today_end)
-    ).scalar() or 0
-    
-    stock_out_today = db.session.query(db.func.sum(InventoryLog.quantity)).filter(
-        InventoryLog.action_type == 'out',
-        InventoryLog.created_at.between(today_start, today_end)
-    ).scalar() or 0
+    recent_activities = InventoryLog.query.options(
+        joinedload(InventoryLog.product), joinedload(InventoryLog.user)
+    ).order_by(InventoryLog.created_at.desc()).limit(5).all()
     
     return render_template('dashboard.html',
-                          total_products=total_products,
-                          low_stock_count=low_stock_count,
-                          out_of_stock_count=out_of_stock_count,
+                          total_products=kpis['total_products'],
+                          low_stock_count=kpis['low_stock_count'],
+                          out_of_stock_count=kpis['out_of_stock_count'],
                           recent_activities=recent_activities,
-                          inventory_value=inventory_value,
-                          stock_in_today=stock_in_today,
-                          stock_out_today=stock_out_today)
+                          inventory_value=kpis['inventory_value'],
+                          stock_in_today=kpis['stock_in_today'],
+                          stock_out_today=kpis['stock_out_today'])
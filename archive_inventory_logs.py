@@ -0,0 +1,19 @@
+from app import app
+from services.archive import archive_cutoff, archive_logs
+import sys
+import time
+
+def archive(days=None):
+    with app.app_context():
+        started = time.time()
+        cutoff = archive_cutoff(days)
+        count = archive_logs(days)
+        
+        print(f"Archived {count} inventory log rows from before {cutoff:%Y-%m-%d} in {time.time() - started:.1f}s")
+
+if __name__ == "__main__":
+    # Run nightly (e.g. from cron); --days N overrides INVENTORY_LOG_ARCHIVE_DAYS
+    days = None
+    if '--days' in sys.argv:
+        days = int(sys.argv[sys.argv.index('--days') + 1])
+    archive(days)
@@ -0,0 +1,79 @@
+"""Time the hot inventory log and product filters with and without their indexes.
+
+Usage: python bench/bench_log_indexes.py [log rows, default 1000000]
+"""
+import common
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from app import app, db
+from models import Product, InventoryLog
+
+PRODUCTS = 1000
+CHUNK = 50000
+
+def populate(rows):
+    random.seed(1)
+    db.session.execute(insert(Product), [
+        {'name': f'Product {i:05d}', 'sku': f'SKU{i:05d}', 'category': f'Category {i % 12}',
+         'quantity': random.randint(0, 200), 'price_cost': 1, 'price_sell': 2}
+        for i in range(PRODUCTS)
+    ])
+    
+    # Two years of movements, oldest first
+    start = datetime.utcnow() - timedelta(days=730)
+    step = 730 * 86400 / rows
+    for offset in range(0, rows, CHUNK):
+        db.session.execute(insert(InventoryLog), [
+            {'product_id': random.randint(1, PRODUCTS), 'action_type': random.choice(('in', 'out', 'adjust')),
+             'quantity': random.randint(1, 20), 'reason': 'bench', 'created_by': 1,
+             'created_at': start + timedelta(seconds=i * step)}
+            for i in range(offset, min(offset + CHUNK, rows))
+        ])
+    db.session.commit()
+    db.session.execute(db.text('ANALYZE'))
+
+def queries():
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    month_start = today.replace(day=1)
+    newest_first = (InventoryLog.created_at.desc(), InventoryLog.id.desc())
+    
+    return {
+        'recent activities (dashboard)': lambda: InventoryLog.query.order_by(*newest_first).limit(5).all(),
+        "today's stock-in sum": lambda: db.session.query(db.func.sum(InventoryLog.quantity)).filter(
+            InventoryLog.action_type == 'in', InventoryLog.created_at >= today).scalar(),
+        'history, one action this month': lambda: InventoryLog.query.filter(
+            InventoryLog.action_type == 'out', InventoryLog.created_at >= month_start
+        ).order_by(*newest_first).limit(20).all(),
+        'history, one product': lambda: InventoryLog.query.filter_by(
+            product_id=PRODUCTS // 2).order_by(*newest_first).limit(20).all(),
+        'low stock products': lambda: Product.query.filter(Product.quantity <= 10).order_by(Product.quantity).all(),
+        'product list, one category': lambda: Product.query.filter_by(
+            category='Category 3').order_by(Product.name).limit(20).all(),
+    }
+
+def set_indexes(create):
+    for model in (Product, InventoryLog):
+        for index in model.__table__.indexes:
+            if create:
+                index.create(db.engine, checkfirst=True)
+            else:
+                index.drop(db.engine, checkfirst=True)
+    db.session.execute(db.text('ANALYZE'))
+
+def run(rows):
+    with app.app_context():
+        populate(rows)
+        print(f"{rows} log rows, {PRODUCTS} products; median of 5 runs")
+        
+        timings = {}
+        for create in (False, True):
+            set_indexes(create)
+            for name, query in queries().items():
+                timings.setdefault(name, []).append(common.timed(query))
+        
+        for name, (before, after) in timings.items():
+            print(f"  {name:32} {before:9.2f} ms -> {after:7.2f} ms")
+
+if __name__ == "__main__":
+    run(common.row_count(1000000))
@@ -0,0 +1,69 @@
+"""Compare product search: ilike substring scan vs the full-text index.
+
+Usage: python bench/bench_search.py [products, default 1000000]
+"""
+import common
+import time
+import random
+from sqlalchemy import insert
+from app import app, db
+from models import Product
+from services.search import search_products, rebuild_search_index
+
+CHUNK = 50000
+ADJECTIVES = ['running', 'trail', 'classic', 'court', 'street', 'training', 'retro', 'ultra', 'lite', 'pro']
+ITEMS = ['shoe', 'sneaker', 'jacket', 'hoodie', 'tee', 'shorts', 'cap', 'sock', 'bag', 'pant']
+COLORS = ['black', 'white', 'red', 'blue', 'green', 'grey', 'navy', 'pink']
+
+def populate(count):
+    random.seed(1)
+    for offset in range(0, count, CHUNK):
+        db.session.execute(insert(Product), [
+            {'name': f'{random.choice(ADJECTIVES).title()} {random.choice(ITEMS).title()} {i}',
+             'sku': f'SKU{i:07d}', 'barcode': f'400{i:09d}', 'category': random.choice(ITEMS),
+             'color': random.choice(COLORS), 'quantity': 1, 'price_cost': 1, 'price_sell': 2}
+            for i in range(offset, min(offset + CHUNK, count))
+        ])
+        db.session.commit()
+
+def ilike_search(query, term):
+    """The list page's previous search."""
+    return query.filter(
+        Product.name.ilike(f'%{term}%') |
+        Product.sku.ilike(f'%{term}%') |
+        Product.barcode.ilike(f'%{term}%')
+    ).order_by(Product.name)
+
+def first_page(search, term):
+    """What the list page runs: one page of 10 plus the total count."""
+    query = search(Product.query, term)
+    query.limit(10).all()
+    return query.order_by(None).count()
+
+def run(count):
+    with app.app_context():
+        started = time.time()
+        populate(count)
+        print(f"{count} products inserted (index kept in sync by triggers) in {time.time() - started:.0f}s")
+        
+        started = time.time()
+        rebuild_search_index()
+        print(f"Full index rebuild in {time.time() - started:.0f}s")
+        
+        middle = count // 2
+        terms = {
+            'exact SKU': f'SKU{middle:07d}',
+            'barcode': f'400{middle:09d}',
+            'two words': 'trail jacket',
+            'common prefix': 'run',
+        }
+        
+        print("First page plus count, median of 5 runs")
+        for name, term in terms.items():
+            hits = first_page(search_products, term)
+            before = common.timed(lambda: first_page(ilike_search, term))
+            after = common.timed(lambda: first_page(search_products, term))
+            print(f"  {name:14} {before:8.1f} ms -> {after:7.1f} ms ({hits} hits)")
+
+if __name__ == "__main__":
+    run(common.row_count(1000000))
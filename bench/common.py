@@ -0,0 +1,39 @@
+"""Shared setup for the benchmark scripts.
+
+Importing this module points the app at a scratch SQLite database (the
+app connects and migrates when it is imported) and silences INFO logs,
+so import it before ``app``. Run the scripts from the repository root, e.g.
+``python bench/bench_log_indexes.py``.
+"""
+import os
+import sys
+import time
+import atexit
+import shutil
+import logging
+import tempfile
+import statistics
+
+_tmp = tempfile.mkdtemp(prefix='jockey_wms_bench_')
+atexit.register(shutil.rmtree, _tmp, ignore_errors=True)
+os.environ['DATABASE_TYPE'] = 'sqlite'
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp, 'bench.sqlite')}"
+os.environ.setdefault('SESSION_SECRET', 'bench')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The app logs every statement at DEBUG, which would dominate the timings
+logging.disable(logging.INFO)
+
+def timed(func, repeat=5):
+    """Return the median wall time of ``func()`` in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+def row_count(default):
+    """Row count from the first command-line argument, or ``default``."""
+    return int(sys.argv[1]) if len(sys.argv) > 1 else default
@@ -0,0 +1,27 @@
+from app import app, db
+from models import ProductImage
+from services.images import build_variants
+import time
+
+def build(rebuild=False):
+    with app.app_context():
+        started = time.time()
+        query = ProductImage.query
+        if not rebuild:
+            query = query.filter(ProductImage.variants.is_(None))
+        
+        built = failed = 0
+        for image in query.all():
+            try:
+                build_variants(image)
+                built += 1
+            except (OSError, ValueError) as e:
+                print(f"Skipping {image.image_url}: {e}")
+                failed += 1
+            db.session.commit()
+        
+        print(f"Built variants for {built} images ({failed} failed) in {time.time() - started:.1f}s")
+
+if __name__ == "__main__":
+    import sys
+    build(rebuild='--all' in sys.argv)
@@ -0,0 +1,25 @@
+from app import app
+from services.snapshots import check_consistency, take_snapshots
+import sys
+
+def check(fix=False):
+    with app.app_context():
+        mismatches = check_consistency()
+        
+        for row in mismatches:
+            print(f"{row['sku']} ({row['name']}): quantity {row['quantity']}, "
+                  f"snapshot and ledger say {row['expected']}")
+        
+        if not mismatches:
+            print("Every product quantity matches its snapshot and ledger.")
+            return True
+        
+        print(f"{len(mismatches)} products disagree with their ledger.")
+        if fix:
+            # Accept the current quantities as the new starting point
+            take_snapshots([row['product_id'] for row in mismatches], changed_only=False, verify=False)
+            print("Took new snapshots at the current quantities.")
+        return False
+
+if __name__ == "__main__":
+    sys.exit(0 if check(fix='--fix' in sys.argv) else 1)
@@ -0,0 +1,13 @@
+from app import app
+from services.images import collect_garbage
+import sys
+
+def collect(dry_run=False):
+    with app.app_context():
+        removed, size = collect_garbage(dry_run=dry_run)
+        
+        action = "Would remove" if dry_run else "Removed"
+        print(f"{action} {removed} unreferenced image files ({size / 1024 / 1024:.1f} MB)")
+
+if __name__ == "__main__":
+    collect(dry_run='--dry-run' in sys.argv)
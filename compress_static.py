@@ -0,0 +1,13 @@
+from app import app
+from services.assets import compress_static_files, brotli
+import sys
+
+def compress(force=False):
+    with app.app_context():
+        written = compress_static_files(force=force)
+        
+        encodings = "gzip and brotli" if brotli is not None else "gzip (install brotli for .br copies)"
+        print(f"Wrote {written} precompressed static files ({encodings})")
+
+if __name__ == "__main__":
+    compress(force='--force' in sys.argv)
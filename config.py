@@ -12,8 +12,8 @@ class Config:
         # MySQL database configuration
         SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL")
     else:
-        # SQLite database configuration (default)
-        SQLALCHEMY_DATABASE_URI = 'sqlite:///jockey_wms.sqlite'
+        # SQLite database configuration (default); DATABASE_URL can point elsewhere, e.g. for tests
+        SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", 'sqlite:///jockey_wms.sqlite')
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ENGINE_OPTIONS = {
@@ -25,9 +25,47 @@ class Config:
     UPLOAD_FOLDER = os.path.join('static', 'uploads')
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5MB max upload size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    IMAGE_VARIANT_SIZES = {'thumb': 160, 'medium': 800}  # longest side in pixels
+    IMAGE_GC_GRACE = 3600  # seconds a new unreferenced upload is safe from garbage collection
+    
+    # Static files, see services/assets.py
+    STATIC_MAX_AGE = 365 * 24 * 3600  # for fingerprinted and content-addressed URLs
+    PRECOMPRESS_EXTENSIONS = {'.css', '.js', '.svg'}
     
     # Pagination
     PER_PAGE = 10
+    TYPEAHEAD_PAGE_SIZE = 20  # results per page of the product lookup API
+    COUNT_CACHE_TTL = 60  # seconds a paged list's total count is reused
+    
+    # Settings, see services/settings.py
+    SETTINGS_CHECK_INTERVAL = 5  # seconds between checks for changes made by other workers
+    
+    # Inventory log archival, see services/archive.py
+    INVENTORY_LOG_ARCHIVE_DAYS = int(os.environ.get("INVENTORY_LOG_ARCHIVE_DAYS", 365))
+    ARCHIVE_BATCH_SIZE = 10000  # rows moved per transaction
+    
+    # Maximum number of lines accepted by the scan-session batch endpoint
+    BATCH_MAX_LINES = 1000
+    
+    # Background jobs
+    JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+    JOB_TIMEOUT = 30 * 60  # seconds before an unfinished job is considered dead
+    JOB_HEARTBEAT_TIMEOUT = 5 * 60  # seconds of silence before a resumable job is restarted
+    
+    # Rows written per committed chunk by the product importer
+    IMPORT_CHUNK_SIZE = 1000
+    
+    # Dashboard KPI cache; set KPI_CACHE_FILE to share invalidations between workers
+    KPI_CACHE_TTL = 60  # seconds
+    KPI_CACHE_FILE = os.environ.get("KPI_CACHE_FILE")
+    
+    # Barcode lookup cache for the scanner endpoints (per process)
+    BARCODE_CACHE_SIZE = 5000  # entries
+    BARCODE_CACHE_TTL = 30  # seconds
+    
+    # Logged-in users, see services/users.py
+    USER_CACHE_SIZE = 1000  # entries
+    USER_CACHE_TTL = 30  # seconds other workers may serve a changed or deleted user
 
 class DevelopmentConfig(Config):
     """Development configuration."""
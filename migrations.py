@@ -0,0 +1,147 @@
+"""Versioned schema migrations.
+
+Each migration is a function registered with ``@migration(version, name)``.
+``run_migrations()`` applies every migration newer than the highest
+version recorded in ``schema_version``, in order, and records it.
+Migrations must be idempotent: on a fresh database the initial
+``create_all`` already builds the current models, indexes included.
+"""
+import logging
+from sqlalchemy import inspect
+from app import db
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+def migration(version, name):
+    """Register a migration function under a version number."""
+    def decorator(func):
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+def create_index(model, index_name):
+    """Create one of a model's declared indexes if it does not exist yet."""
+    for index in model.__table__.indexes:
+        if index.name == index_name:
+            index.create(db.engine, checkfirst=True)
+            return
+    raise ValueError(f'{model.__name__} declares no index named {index_name}')
+
+def add_column(model, column_name):
+    """Add one of a model's declared columns to its table if it is missing."""
+    table = model.__table__
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    if column_name in existing:
+        return
+    
+    column_type = table.columns[column_name].type.compile(dialect=db.engine.dialect)
+    with db.engine.begin() as connection:
+        connection.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column_name} {column_type}'))
+
+@migration(1, 'initial schema')
+def initial_schema():
+    db.create_all()
+
+@migration(2, 'indexes for inventory log and product filters')
+def hot_filter_indexes():
+    from models import Product, InventoryLog
+    
+    for index_name in ('ix_inventory_log_created_at',
+                       'ix_inventory_log_action_created',
+                       'ix_inventory_log_product_created'):
+        create_index(InventoryLog, index_name)
+    
+    for index_name in ('ix_product_category_name', 'ix_product_name', 'ix_product_quantity'):
+        create_index(Product, index_name)
+
+@migration(3, 'background job table')
+def job_table():
+    from models import Job
+    
+    Job.__table__.create(db.engine, checkfirst=True)
+
+@migration(4, 'job checkpoints for resumable imports')
+def job_checkpoints():
+    from models import Job
+    
+    add_column(Job, 'checkpoint')
+    add_column(Job, 'heartbeat_at')
+
+@migration(5, 'full-text product search index')
+def product_search_index():
+    from models import ProductAttribute
+    from services.search import create_search_index, rebuild_search_index
+    
+    # The index triggers look up a product's attributes by product id
+    create_index(ProductAttribute, 'ix_product_attribute_product')
+    create_search_index()
+    rebuild_search_index()
+
+@migration(6, 'product image variants')
+def product_image_variants():
+    from models import ProductImage
+    
+    add_column(ProductImage, 'variants')
+
+@migration(7, 'product image url index')
+def product_image_url_index():
+    from models import ProductImage
+    
+    create_index(ProductImage, 'ix_product_image_url')
+
+@migration(8, 'daily movement rollup')
+def daily_movement_rollup():
+    from models import DailyMovement, ArchivedInventoryLog
+    from services.rollup import rebuild_daily_movements
+    
+    DailyMovement.__table__.create(db.engine, checkfirst=True)
+    # The rebuild (and migration 9's snapshots) read the archive too
+    ArchivedInventoryLog.__table__.create(db.engine, checkfirst=True)
+    rebuild_daily_movements()
+
+@migration(9, 'stock snapshots')
+def stock_snapshots():
+    from models import InventoryLog, StockSnapshot
+    from services.snapshots import take_snapshots
+    
+    create_index(InventoryLog, 'ix_inventory_log_product_id')
+    StockSnapshot.__table__.create(db.engine, checkfirst=True)
+    # Anchor every product at its current quantity
+    take_snapshots(verify=False)
+
+@migration(10, 'inventory log archive')
+def inventory_log_archive():
+    from models import ArchivedInventoryLog
+    
+    ArchivedInventoryLog.__table__.create(db.engine, checkfirst=True)
+
+@migration(11, 'scan batch keys')
+def scan_batch_keys():
+    from models import ScanBatch
+    
+    ScanBatch.__table__.create(db.engine, checkfirst=True)
+
+def current_version():
+    """Return the highest applied migration version, or 0."""
+    from models import SchemaVersion
+    
+    return db.session.query(db.func.max(SchemaVersion.version)).scalar() or 0
+
+def run_migrations():
+    """Apply all pending migrations in version order."""
+    from models import SchemaVersion
+    
+    SchemaVersion.__table__.create(db.engine, checkfirst=True)
+    applied = current_version()
+    
+    for version, name, func in MIGRATIONS:
+        if version <= applied:
+            continue
+        
+        logger.info(f"Applying migration {version}: {name}")
+        func()
+        db.session.add(SchemaVersion(version=version, name=name))
+        db.session.commit()
@@ -39,48 +39,86 @@ class Product(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_product_category_name', 'category', 'name'),
+        db.Index('ix_product_name', 'name'),
+        db.Index('ix_product_quantity', 'quantity'),
+    )
+    
     # Relationships
-    images = db.relationship('ProductImage', backref='product', cascade='all, delete-orphan')
+    images = db.relationship('ProductImage', backref='product', cascade='all, delete-orphan',
+                             order_by='ProductImage.id')
     attributes = db.relationship('ProductAttribute', backref='product', cascade='all, delete-orphan')
     inventory_logs = db.relationship('InventoryLog', backref='product', cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Product {self.name}>'
     
-    def get_main_image(self):
-        """Get the featured image or the first image."""
-        featured = ProductImage.query.filter_by(product_id=self.id, is_featured=True).first()
-        if featured:
-            return featured.image_url
+    def get_main_product_image(self):
+        """Get the featured ProductImage or the first one.
+        
+        Reads the ``images`` collection, so list views should eager-load it
+        with ``selectinload(Product.images)`` to avoid a query per product.
+        """
+        for image in self.images:
+            if image.is_featured:
+                return image
         
-        first = ProductImage.query.filter_by(product_id=self.id).first()
-        if first:
-            return first.image_url
+        if self.images:
+            return self.images[0]
         
         return None
     
-    def get_attribute_value(self, attribute_name):
-        """Get the value of a specific attribute."""
-        attr_def = AttributeDefinition.query.filter_by(name=attribute_name).first()
-        if not attr_def:
+    def get_main_image(self, size=None):
+        """Get the path of the main image, or of its ``size`` variant."""
+        image = self.get_main_product_image()
+        if image is None:
             return None
         
-        attr = ProductAttribute.query.filter_by(
-            product_id=self.id, 
-            attribute_id=attr_def.id
-        ).first()
+        return image.get_variant(size) if size else image.image_url
+    
+    def get_attribute_value(self, attribute_name):
+        """Get the value of a specific attribute."""
+        from services.attributes import fetch_attribute_rows
         
-        if not attr:
+        rows = fetch_attribute_rows([self.id], names=[attribute_name])
+        if not rows:
             return None
         
-        return attr.value
+        return rows[0].value
 
 class ProductImage(db.Model):
     """Product image model."""
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
-    image_url = db.Column(db.String(256), nullable=False)
+    image_url = db.Column(db.String(256), nullable=False)  # The original upload; rows may share it
     is_featured = db.Column(db.Boolean, default=False)
+    variants = db.Column(db.Text)  # JSON string of resized copies, see services/images.py
+    
+    __table_args__ = (
+        db.Index('ix_product_image_url', 'image_url'),
+    )
+    
+    def get_variants(self):
+        """Convert JSON variants string to Python dict."""
+        if self.variants:
+            return json.loads(self.variants)
+        return {}
+    
+    def get_variant(self, size, webp=False):
+        """Get the path of a resized copy.
+        
+        Falls back to the original until the variants are built; for WebP
+        there is no fallback and None is returned instead.
+        """
+        variants = self.get_variants()
+        if webp:
+            return variants.get(f'{size}_webp')
+        return variants.get(size, self.image_url)
+    
+    def get_files(self):
+        """Get the paths of the original and every variant."""
+        return [self.image_url] + list(self.get_variants().values())
     
     def __repr__(self):
         return f'<ProductImage {self.image_url}>'
@@ -113,6 +151,10 @@ class ProductAttribute(db.Model):
     attribute_id = db.Column(db.Integer, db.ForeignKey('attribute_definition.id'), nullable=False)
     value = db.Column(db.Text)
     
+    __table_args__ = (
+        db.Index('ix_product_attribute_product', 'product_id', 'attribute_id'),
+    )
+    
     def __repr__(self):
         return f'<ProductAttribute {self.definition.name}: {self.value}>'
 
@@ -126,12 +168,83 @@ class InventoryLog(db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_inventory_log_created_at', 'created_at'),
+        db.Index('ix_inventory_log_action_created', 'action_type', 'created_at'),
+        db.Index('ix_inventory_log_product_created', 'product_id', 'created_at'),
+        db.Index('ix_inventory_log_product_id', 'product_id', 'id'),
+    )
+    
     # Relationship
     user = db.relationship('User')
     
     def __repr__(self):
         return f'<InventoryLog {self.action_type} {self.quantity}>'
 
+class ArchivedInventoryLog(db.Model):
+    """Inventory log row older than the archive horizon, moved by services/archive.py."""
+    __tablename__ = 'inventory_log_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # The original InventoryLog id
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    action_type = db.Column(db.String(32), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(128))
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_inventory_log_archive_created_at', 'created_at'),
+        db.Index('ix_inventory_log_archive_product_created', 'product_id', 'created_at'),
+        db.Index('ix_inventory_log_archive_product_id', 'product_id', 'id'),
+    )
+    
+    # Relationships; product deletes remove these rows in bulk (routes/products.py)
+    product = db.relationship('Product')
+    user = db.relationship('User')
+    
+    def __repr__(self):
+        return f'<ArchivedInventoryLog {self.action_type} {self.quantity}>'
+
+class DailyMovement(db.Model):
+    """Movement totals per day, product and action type, kept by services/rollup.py."""
+    day = db.Column(db.Date, primary_key=True)  # UTC date of the log rows
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    action_type = db.Column(db.String(32), primary_key=True)  # 'in', 'out', 'adjust'
+    quantity = db.Column(db.Integer, nullable=False, default=0)  # Sum of the logged quantities
+    movements = db.Column(db.Integer, nullable=False, default=0)  # Number of log rows
+    
+    __table_args__ = (
+        db.Index('ix_daily_movement_product_day', 'product_id', 'day'),
+    )
+    
+    def __repr__(self):
+        return f'<DailyMovement {self.day} {self.product_id} {self.action_type} {self.quantity}>'
+
+class StockSnapshot(db.Model):
+    """A product's quantity on hand as of one of its log rows, see services/snapshots.py."""
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    log_id = db.Column(db.Integer, nullable=False, default=0)  # Last InventoryLog id included; 0 for none
+    quantity = db.Column(db.Integer, nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_stock_snapshot_product_taken', 'product_id', 'taken_at'),
+    )
+    
+    def __repr__(self):
+        return f'<StockSnapshot {self.product_id} {self.quantity} @{self.log_id}>'
+
+class ScanBatch(db.Model):
+    """Key of a scan session batch already applied, so a resent batch is not applied twice."""
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), unique=True, nullable=False)  # Generated by the client per batch
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ScanBatch {self.key}>'
+
 class Setting(db.Model):
     """System settings model for configuration."""
     id = db.Column(db.Integer, primary_key=True)
@@ -140,3 +253,46 @@ class Setting(db.Model):
     
     def __repr__(self):
         return f'<Setting {self.key}>'
+
+class Job(db.Model):
+    """Background job (report generation, imports) run by services/jobs.py."""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    params = db.Column(db.Text)  # JSON string of job parameters
+    # Set while the job is pending or running so identical requests share it
+    active_key = db.Column(db.String(64), unique=True)
+    status = db.Column(db.String(16), nullable=False, default='pending')  # 'pending', 'running', 'done', 'failed'
+    progress = db.Column(db.Integer, default=0)
+    total = db.Column(db.Integer)
+    result_path = db.Column(db.String(256))
+    error = db.Column(db.Text)
+    checkpoint = db.Column(db.Text)  # JSON string of the state a resumed job continues from
+    heartbeat_at = db.Column(db.DateTime)  # Last sign of life from the worker running the job
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def get_params(self):
+        """Convert JSON params string to Python dict."""
+        if self.params:
+            return json.loads(self.params)
+        return {}
+    
+    def get_checkpoint(self):
+        """Convert JSON checkpoint string to Python dict."""
+        if self.checkpoint:
+            return json.loads(self.checkpoint)
+        return {}
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+class SchemaVersion(db.Model):
+    """Applied schema migrations, see migrations.py."""
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(128), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SchemaVersion {self.version}>'
@@ -0,0 +1,17 @@
+from app import app
+from services.rollup import rebuild_daily_movements
+from datetime import date
+import sys
+import time
+
+def rebuild(since=None):
+    with app.app_context():
+        started = time.time()
+        count = rebuild_daily_movements(since)
+        
+        scope = f"since {since}" if since else "from the whole ledger"
+        print(f"Daily movement rollup rebuilt {scope}: {count} rows in {time.time() - started:.1f}s")
+
+if __name__ == "__main__":
+    # Optional YYYY-MM-DD to rebuild only that day and later
+    rebuild(date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,18 @@
+from app import app
+from services.search import rebuild_search_index, search_backend
+import time
+
+def rebuild():
+    with app.app_context():
+        started = time.time()
+        count = rebuild_search_index()
+        
+        backend = search_backend()
+        if backend is None:
+            print("Full-text search is not available for this database; nothing to rebuild.")
+            return
+        
+        print(f"Search index ({backend}) rebuilt for {count} products in {time.time() - started:.1f}s")
+
+if __name__ == "__main__":
+    rebuild()
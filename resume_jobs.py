@@ -0,0 +1,12 @@
+from app import app
+from services.jobs import resume_stale_jobs
+
+def resume():
+    with app.app_context():
+        count = resume_stale_jobs()
+        
+        print(f"Resumed {count} stale jobs")
+
+if __name__ == "__main__":
+    # Runs the resumed jobs in this process and waits for them to finish
+    resume()
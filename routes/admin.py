@@ -1,12 +1,16 @@
 import os
 import json
-import tempfile
+import uuid
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from app import db
-from models import User, AttributeDefinition, Setting, Product, ProductAttribute
-from utils import parse_excel_import
+from models import User, AttributeDefinition, Product, ProductAttribute, Job
+from services.jobs import submit_job, resume_job
+from services.barcodes import barcode_cache_stats
+from services.settings import get_settings, update_settings, DEFINITIONS
+from services.users import forget_user, user_cache_stats
+import services.importer  # noqa: F401  (registers the product_import job)
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -58,6 +62,7 @@ def delete_user(user_id):
     user = User.query.get_or_404(user_id)
     db.session.delete(user)
     db.session.commit()
+    forget_user(user_id)
     
     flash(f'User {user.username} deleted successfully', 'success')
     return redirect(url_for('admin.users'))
@@ -207,18 +212,26 @@ def settings():
         return redirect(url_for('index'))
     
     if request.method == 'POST':
-        barcode_type = request.form.get('barcode_type', 'code128')
+        values = {key: request.form[key] for key in DEFINITIONS if key in request.form}
         
-        # Update settings
-        update_setting('barcode_type', barcode_type)
+        # Update settings; nothing is saved if one value is invalid
+        try:
+            update_settings(values)
+        except ValueError as e:
+            flash(f'Invalid setting: {e}', 'danger')
+            return redirect(url_for('admin.settings'))
         
         flash('Settings updated successfully', 'success')
         return redirect(url_for('admin.settings'))
     
     # Get current settings
-    barcode_type = get_setting('barcode_type', 'code128')
+    settings = get_settings()
     
-    return render_template('admin/settings.html', barcode_type=barcode_type)
+    return render_template('admin/settings.html',
+                          barcode_type=settings['barcode_type'],
+                          low_stock_threshold=settings['low_stock_threshold'],
+                          products_per_page=settings['products_per_page'],
+                          history_per_page=settings['history_per_page'])
 
 @bp.route('/import-export', methods=['GET', 'POST'])
 @login_required
@@ -244,130 +257,63 @@ def import_export():
                 flash('No file selected', 'danger')
                 return redirect(url_for('admin.import_export'))
             
-            if not file.filename.endswith(('.xlsx', '.xls')):
-                flash('Invalid file format. Please upload an Excel file (.xlsx, .xls)', 'danger')
-                return redirect(url_for('admin.import_export'))
-            
-            # Save file temporarily
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp:
-                file.save(temp.name)
-                temp_path = temp.name
-            
-            # Parse Excel file
-            products_data = parse_excel_import(temp_path)
-            
-            # Delete temporary file
-            os.unlink(temp_path)
-            
-            if not products_data:
-                flash('Failed to parse Excel file or no valid products found', 'danger')
+            if not file.filename.lower().endswith(('.xlsx', '.xls', '.csv')):
+                flash('Invalid file format. Please upload an Excel or CSV file (.xlsx, .xls, .csv)', 'danger')
                 return redirect(url_for('admin.import_export'))
             
-            # Process products
-            imported_count = 0
-            updated_count = 0
-            error_count = 0
-            
-            for product_data in products_data:
-                try:
-                    # Check if product exists
-                    product = Product.query.filter_by(sku=product_data['sku']).first()
-                    
-                    if product:
-                        # Update existing product
-                        product.name = product_data['name']
-                        product.barcode = product_data['barcode']
-                        product.category = product_data['category']
-                        product.size = product_data['size']
-                        product.color = product_data['color']
-                        product.gender = product_data['gender']
-                        product.material = product_data['material']
-                        product.price_cost = product_data['price_cost']
-                        product.price_sell = product_data['price_sell']
-                        product.quantity = product_data['quantity']
-                        product.location = product_data['location']
-                        
-                        updated_count += 1
-                    else:
-                        # Create new product
-                        product = Product(
-                            sku=product_data['sku'],
-                            name=product_data['name'],
-                            barcode=product_data['barcode'],
-                            category=product_data['category'],
-                            size=product_data['size'],
-                            color=product_data['color'],
-                            gender=product_data['gender'],
-                            material=product_data['material'],
-                            price_cost=product_data['price_cost'],
-                            price_sell=product_data['price_sell'],
-                            quantity=product_data['quantity'],
-                            location=product_data['location']
-                        )
-                        
-                        db.session.add(product)
-                        db.session.flush()  # Get product ID without committing
-                        
-                        imported_count += 1
-                    
-                    # Process dynamic attributes
-                    for attr_name, attr_value in product_data['attributes'].items():
-                        # Find or create attribute definition
-                        attr_def = AttributeDefinition.query.filter_by(name=attr_name).first()
-                        
-                        if not attr_def:
-                            # Create new attribute definition
-                            attr_def = AttributeDefinition(
-                                name=attr_name,
-                                type='text',
-                                required=False
-                            )
-                            db.session.add(attr_def)
-                            db.session.flush()  # Get attribute ID without committing
-                        
-                        # Find existing attribute value
-                        attr = ProductAttribute.query.filter_by(
-                            product_id=product.id,
-                            attribute_id=attr_def.id
-                        ).first()
-                        
-                        if attr:
-                            # Update existing attribute
-                            attr.value = attr_value
-                        else:
-                            # Create new attribute value
-                            attr = ProductAttribute(
-                                product_id=product.id,
-                                attribute_id=attr_def.id,
-                                value=attr_value
-                            )
-                            db.session.add(attr)
-                    
-                except Exception as e:
-                    current_app.logger.error(f"Import error for SKU {product_data['sku']}: {e}")
-                    error_count += 1
+            # Keep the upload until the import job has finished with it, outside
+            # static/ so supplier files are never served
+            imports_folder = os.path.join(current_app.instance_path, 'imports')
+            os.makedirs(imports_folder, exist_ok=True)
+            extension = os.path.splitext(file.filename)[1].lower()
+            file_path = os.path.join(imports_folder, f"{uuid.uuid4().hex}{extension}")
+            file.save(file_path)
             
-            db.session.commit()
+            job = submit_job('product_import', {
+                'path': file_path,
+                'filename': secure_filename(file.filename),
+                'chunk_size': current_app.config['IMPORT_CHUNK_SIZE']
+            }, current_user.id)
             
-            flash(f'Import complete. Imported: {imported_count}, Updated: {updated_count}, Errors: {error_count}', 'success')
-            return redirect(url_for('admin.import_export'))
+            return redirect(url_for('admin.import_job', job_id=job.id))
+    
+    recent_imports = Job.query.filter_by(kind='product_import').order_by(Job.created_at.desc()).limit(5).all()
     
-    return render_template('admin/import_export.html')
+    # Pick up an unfinished import whose worker died
+    for job in recent_imports:
+        resume_job(job)
+    return render_template('admin/import_export.html', recent_imports=recent_imports)
 
-def get_setting(key, default=None):
-    """Get a setting value from the database."""
-    setting = Setting.query.filter_by(key=key).first()
-    if setting:
-        return setting.value
-    return default
+@bp.route('/import-jobs/<int:job_id>')
+@login_required
+def import_job(job_id):
+    """Show the progress and outcome of a product import."""
+    # Only admins can import/export
+    if not current_user.is_admin():
+        flash('You do not have permission to import/export products', 'danger')
+        return redirect(url_for('index'))
+    
+    job = Job.query.filter_by(id=job_id, kind='product_import').first_or_404()
+    
+    error_sheet_url = None
+    if job.status == 'done' and job.result_path:
+        error_sheet_url = url_for('static', filename=os.path.relpath(job.result_path, 'static'))
+    
+    return render_template('admin/import_job.html', job=job, error_sheet_url=error_sheet_url)
 
-def update_setting(key, value):
-    """Update or create a setting in the database."""
-    setting = Setting.query.filter_by(key=key).first()
-    if setting:
-        setting.value = value
-    else:
-        setting = Setting(key=key, value=value)
-        db.session.add(setting)
+@bp.route('/cache-stats')
+@login_required
+def cache_stats():
+    """Report this worker's cache sizes and hit/miss counters."""
+    # Only admins can view cache statistics
+    if not current_user.is_admin():
+        return jsonify({'success': False, 'message': 'Permission denied'}), 403
     
-    db.session.commit()
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'caches': {
+            'barcode': barcode_cache_stats(),
+            'user': user_cache_stats()
+        }
+    })
@@ -3,6 +3,7 @@ from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
 from models import User
+from services.users import forget_user
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
@@ -115,6 +116,7 @@ def profile():
             else:
                 current_user.email = email
                 db.session.commit()
+                forget_user(current_user.id)
                 flash('Email updated successfully', 'success')
         
         # Update password if provided
@@ -127,6 +129,7 @@ def profile():
             else:
                 current_user.password_hash = generate_password_hash(new_password)
                 db.session.commit()
+                forget_user(current_user.id)
                 flash('Password updated successfully', 'success')
         
     return render_template('auth/profile.html')
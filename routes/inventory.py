@@ -1,7 +1,14 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
-from app import db
-from models import Product, InventoryLog
+from models import Product, InventoryLog, ArchivedInventoryLog
+from services.stock import record_movement, record_batch, InsufficientStock, ProductNotFound, DuplicateBatch
+from services.kpi import get_kpis
+from services.barcodes import product_snapshot, make_snapshot
+from services.pagination import keyset_paginate_partitions, cached_count
+from services.settings import get_setting
+from services.snapshots import quantity_as_of
+from services.archive import archive_horizon
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 
 bp = Blueprint('inventory', __name__, url_prefix='/inventory')
@@ -10,15 +17,20 @@ bp = Blueprint('inventory', __name__, url_prefix='/inventory')
 @login_required
 def index():
     """Inventory management dashboard."""
-    # Get low stock items (quantity less than 10)
-    low_stock = Product.query.filter(Product.quantity < 10).order_by(Product.quantity).limit(5).all()
+    low_stock_threshold = get_setting('low_stock_threshold')
+    
+    # Get low stock items (quantity at or below the threshold)
+    low_stock = Product.query.filter(
+        Product.quantity <= low_stock_threshold
+    ).order_by(Product.quantity).limit(5).all()
     
     # Get recent inventory activities
     recent_activities = InventoryLog.query.order_by(InventoryLog.created_at.desc()).limit(10).all()
     
-    # Get total product count and total inventory value
-    total_products = Product.query.count()
-    total_value = db.session.query(db.func.sum(Product.quantity * Product.price_cost)).scalar() or 0
+    # Get total product count and total inventory value (cached)
+    kpis = get_kpis(low_stock_threshold)
+    total_products = kpis['total_products']
+    total_value = kpis['inventory_cost']
     
     return render_template('inventory/scan.html', 
                           low_stock=low_stock,
@@ -57,26 +69,20 @@ def stock_in():
         product = Product.query.get_or_404(product_id)
         quantity = int(quantity)
         
-        # Create inventory log
-        log = InventoryLog(
-            product_id=product.id,
-            action_type='in',
-            quantity=quantity,
-            reason=reason,
-            created_by=current_user.id
-        )
-        
-        # Update product quantity
-        product.quantity += quantity
-        
-        db.session.add(log)
-        db.session.commit()
+        try:
+            record_movement(product.id, 'in', quantity, reason, current_user.id)
+        except ProductNotFound:
+            flash('Product not found', 'danger')
+            return redirect(url_for('inventory.stock_in'))
         
         flash(f'Successfully added {quantity} units of {product.name}', 'success')
         return redirect(url_for('inventory.index'))
     
-    # For GET request, show form with product selection
-    return render_template('inventory/stock_in.html')
+    # For GET request, show the form; only a product linked from elsewhere is loaded
+    product_id = request.args.get('product_id')
+    selected = Product.query.get(product_id) if product_id else None
+    
+    return render_template('inventory/stock_in.html', selected=selected)
 
 @bp.route('/stock-out', methods=['GET', 'POST'])
 @login_required
@@ -105,34 +111,27 @@ def stock_out():
             flash(error, 'danger')
             return redirect(url_for('inventory.stock_out'))
         
-        # Get product and validate quantity
+        # Get product and update quantity; the service rejects overdrafts
         product = Product.query.get_or_404(product_id)
         quantity = int(quantity)
         
-        if product.quantity < quantity:
-            flash(f'Not enough inventory. Current quantity: {product.quantity}', 'danger')
+        try:
+            record_movement(product.id, 'out', quantity, reason, current_user.id)
+        except InsufficientStock as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('inventory.stock_out'))
+        except ProductNotFound:
+            flash('Product not found', 'danger')
             return redirect(url_for('inventory.stock_out'))
-        
-        # Create inventory log
-        log = InventoryLog(
-            product_id=product.id,
-            action_type='out',
-            quantity=quantity,
-            reason=reason,
-            created_by=current_user.id
-        )
-        
-        # Update product quantity
-        product.quantity -= quantity
-        
-        db.session.add(log)
-        db.session.commit()
         
         flash(f'Successfully removed {quantity} units of {product.name}', 'success')
         return redirect(url_for('inventory.index'))
     
-    # For GET request, show form with product selection
-    return render_template('inventory/stock_out.html')
+    # For GET request, show the form; only a product linked from elsewhere is loaded
+    product_id = request.args.get('product_id')
+    selected = Product.query.get(product_id) if product_id else None
+    
+    return render_template('inventory/stock_out.html', selected=selected)
 
 @bp.route('/adjust', methods=['GET', 'POST'])
 @login_required
@@ -161,25 +160,15 @@ def adjust():
             flash(error, 'danger')
             return redirect(url_for('inventory.adjust'))
         
-        # Get product and calculate adjustment
+        # Get product and set the new count; the adjustment is computed under lock
         product = Product.query.get_or_404(product_id)
         new_quantity = int(new_quantity)
-        adjustment = new_quantity - product.quantity
-        
-        # Create inventory log
-        log = InventoryLog(
-            product_id=product.id,
-            action_type='adjust',
-            quantity=adjustment,
-            reason=reason,
-            created_by=current_user.id
-        )
         
-        # Update product quantity
-        product.quantity = new_quantity
-        
-        db.session.add(log)
-        db.session.commit()
+        try:
+            record_movement(product.id, 'adjust', new_quantity, reason, current_user.id)
+        except ProductNotFound:
+            flash('Product not found', 'danger')
+            return redirect(url_for('inventory.adjust'))
         
         flash(f'Successfully adjusted inventory for {product.name}', 'success')
         return redirect(url_for('inventory.index'))
@@ -187,12 +176,100 @@ def adjust():
     # For GET request, show form with product selection
     return render_template('inventory/adjust.html')
 
+@bp.route('/batch', methods=['POST'])
+@login_required
+def batch():
+    """Apply a batch of scanned movements from a scan session."""
+    # Only staff can move stock
+    if not current_user.is_staff():
+        return jsonify({'success': False, 'message': 'Permission denied'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    lines = data.get('lines')
+    # Sent again with the batch when the client is unsure it arrived
+    key = data.get('key')
+    
+    if not isinstance(lines, list) or not lines:
+        return jsonify({'success': False, 'message': 'At least one line is required'}), 400
+    
+    if key is not None and (not isinstance(key, str) or not 0 < len(key) <= 64):
+        return jsonify({'success': False, 'message': 'Invalid batch key'}), 400
+    
+    max_lines = current_app.config['BATCH_MAX_LINES']
+    if len(lines) > max_lines:
+        return jsonify({'success': False, 'message': f'A batch may contain at most {max_lines} lines'}), 400
+    
+    # Validate every line up front; only valid lines reach the database
+    results = [None] * len(lines)
+    valid = []
+    
+    for index, line in enumerate(lines):
+        error = _validate_batch_line(line)
+        if error:
+            results[index] = {'line': index, 'success': False, 'message': error}
+        else:
+            valid.append((index, {
+                'product_id': int(line['product_id']) if line.get('product_id') else None,
+                'barcode': line.get('barcode'),
+                'qty': int(line['qty']),
+                'action': line['action'],
+                'reason': line['reason']
+            }))
+    
+    if valid:
+        try:
+            applied = record_batch([line for _, line in valid], current_user.id, batch_key=key)
+        except DuplicateBatch:
+            return jsonify({
+                'success': True,
+                'duplicate': True,
+                'applied': 0,
+                'failed': 0,
+                'results': [],
+                'message': 'These scans were already submitted'
+            })
+        for (index, _), result in zip(valid, applied):
+            result['line'] = index
+            results[index] = result
+    
+    applied_count = sum(1 for r in results if r['success'])
+    
+    return jsonify({
+        'success': applied_count == len(results),
+        'applied': applied_count,
+        'failed': len(results) - applied_count,
+        'results': results
+    })
+
+def _validate_batch_line(line):
+    """Return an error message for an invalid batch line, or None."""
+    if not isinstance(line, dict):
+        return 'Invalid line'
+    
+    action = line.get('action')
+    qty = line.get('qty')
+    
+    if not line.get('product_id') and not line.get('barcode'):
+        return 'Product ID or barcode required'
+    if line.get('product_id') and not str(line['product_id']).isdigit():
+        return 'Invalid product ID'
+    if action not in ('in', 'out', 'adjust'):
+        return 'Invalid action'
+    if action == 'adjust' and not current_user.is_admin():
+        return 'Permission denied'
+    if not str(qty).isdigit() or (action != 'adjust' and int(qty) <= 0):
+        return 'Valid quantity is required'
+    if not line.get('reason'):
+        return 'Reason is required'
+    
+    return None
+
 @bp.route('/history')
 @login_required
 def history():
     """View inventory history."""
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
+    cursor = request.args.get('cursor')
+    per_page = get_setting('history_per_page')
     
     # Apply filters
     product_id = request.args.get('product_id')
@@ -200,39 +277,59 @@ def history():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     
-    # Base query
-    query = InventoryLog.query
-    
-    # Apply filters
-    if product_id:
-        query = query.filter_by(product_id=product_id)
-    
-    if action_type:
-        query = query.filter_by(action_type=action_type)
-    
+    start = end = None
     if start_date:
         try:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d')
-            query = query.filter(InventoryLog.created_at >= start_date)
+            start = start_date = datetime.strptime(start_date, '%Y-%m-%d')
         except ValueError:
             flash('Invalid start date format', 'warning')
     
     if end_date:
         try:
-            end_date = datetime.strptime(end_date, '%Y-%m-%d')
-            query = query.filter(InventoryLog.created_at <= end_date)
+            end = end_date = datetime.strptime(end_date, '%Y-%m-%d')
         except ValueError:
             flash('Invalid end date format', 'warning')
     
-    # Order by date descending
-    logs = query.order_by(InventoryLog.created_at.desc()).paginate(page=page, per_page=per_page)
+    def filtered(model):
+        # Product and user are joined in for the table rows
+        query = model.query.options(joinedload(model.product), joinedload(model.user))
+        
+        if product_id:
+            query = query.filter_by(product_id=product_id)
+        if action_type:
+            query = query.filter_by(action_type=action_type)
+        if start:
+            query = query.filter(model.created_at >= start)
+        if end:
+            query = query.filter(model.created_at <= end)
+        
+        return query
+    
+    # Live rows first, then archived ones when the range reaches back that far
+    query = filtered(InventoryLog)
+    partitions = [(query, [InventoryLog.created_at, InventoryLog.id])]
+    key = (product_id, action_type, start, end)
+    total = cached_count(('history',) + key, query)
     
-    # Get products for filter dropdown
-    products = Product.query.order_by(Product.name).all()
+    horizon = archive_horizon()
+    if horizon is not None and (start is None or start <= horizon):
+        archived = filtered(ArchivedInventoryLog)
+        partitions.append((archived, [ArchivedInventoryLog.created_at, ArchivedInventoryLog.id]))
+        total += cached_count(('history_archive',) + key, archived)
+    
+    # Newest first, paged by (created_at, id) so deep pages cost the same as the first
+    try:
+        logs = keyset_paginate_partitions(partitions, per_page, cursor=cursor, descending=True, total=total)
+    except ValueError:
+        flash('Invalid page link', 'warning')
+        logs = keyset_paginate_partitions(partitions, per_page, descending=True, total=total)
+    
+    # Only the selected product is rendered; the filter looks others up on demand
+    selected = Product.query.get(product_id) if product_id else None
     
     return render_template('inventory/history.html', 
                           logs=logs, 
-                          products=products,
+                          selected=selected,
                           action_types=['in', 'out', 'adjust'],
                           selected_product=product_id,
                           selected_action=action_type,
@@ -248,23 +345,44 @@ def get_product():
     
     if product_id:
         product = Product.query.get(product_id)
+        snapshot = make_snapshot(product) if product else None
     elif barcode:
-        product = Product.query.filter_by(barcode=barcode).first()
+        # Cached snapshot; repeated scans of a barcode skip the database
+        snapshot = product_snapshot(barcode)
     else:
         return jsonify({'success': False, 'message': 'Product ID or barcode required'}), 400
     
-    if not product:
+    if not snapshot:
+        return jsonify({'success': False, 'message': 'Product not found'}), 404
+    
+    return jsonify({'success': True, 'product': snapshot})
+
+@bp.route('/quantity-as-of')
+@login_required
+def get_quantity_as_of():
+    """Get a product's quantity on hand at a past date or time (UTC)."""
+    product_id = request.args.get('product_id', type=int)
+    at = request.args.get('at')
+    
+    if not product_id or not at:
+        return jsonify({'success': False, 'message': 'Product ID and date are required'}), 400
+    
+    try:
+        when = datetime.fromisoformat(at)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid date'}), 400
+    
+    # A bare date means the end of that day
+    if len(at) == 10:
+        when = datetime.combine(when.date(), datetime.max.time())
+    
+    quantity = quantity_as_of(product_id, when)
+    if quantity is None:
         return jsonify({'success': False, 'message': 'Product not found'}), 404
     
     return jsonify({
         'success': True,
-        'product': {
-            'id': product.id,
-            'name': product.name,
-            'sku': product.sku,
-            'barcode': product.barcode,
-            'quantity': product.quantity,
-            'price': product.price_sell,
-            'image': product.get_main_image()
-        }
+        'product_id': product_id,
+        'at': when.isoformat(),
+        'quantity': quantity
     })
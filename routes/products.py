@@ -1,10 +1,18 @@
-import os
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
+from sqlalchemy.orm import selectinload
 from app import db
-from models import Product, ProductImage, AttributeDefinition, ProductAttribute
+from models import Product, ProductImage, AttributeDefinition, ProductAttribute, DailyMovement, StockSnapshot, ArchivedInventoryLog
 from utils import generate_sku, save_barcode_image, save_image
+from services.attributes import fetch_attribute_rows
+from services.kpi import invalidate_kpis, get_categories
+from services.barcodes import product_snapshot, forget_barcodes, forget_products
+from services.search import search_products
+from services.pagination import keyset_paginate, cached_count
+from services.images import queue_image_variants, release_images
+from services.settings import get_setting
+from services.snapshots import take_snapshots
 
 bp = Blueprint('products', __name__, url_prefix='/products')
 
@@ -13,30 +21,34 @@ bp = Blueprint('products', __name__, url_prefix='/products')
 def list():
     """List all products."""
     page = request.args.get('page', 1, type=int)
-    per_page = current_app.config['PER_PAGE']
+    cursor = request.args.get('cursor')
+    per_page = get_setting('products_per_page')
     
     # Get filter parameters
     search = request.args.get('search', '')
     category = request.args.get('category', '')
     
-    # Base query
-    query = Product.query
+    # Base query; images are batch-loaded for the thumbnails
+    query = Product.query.options(selectinload(Product.images))
     
     # Apply filters
-    if search:
-        query = query.filter(Product.name.ilike(f'%{search}%') | 
-                            Product.sku.ilike(f'%{search}%') |
-                            Product.barcode.ilike(f'%{search}%'))
-    
     if category:
         query = query.filter_by(category=category)
     
-    # Get distinct categories for filter dropdown
-    categories = db.session.query(Product.category).distinct().all()
-    categories = [c[0] for c in categories if c[0]]
+    # Distinct categories for filter dropdown (cached)
+    categories = get_categories()
     
-    # Paginate results
-    products = query.order_by(Product.name).paginate(page=page, per_page=per_page)
+    # Search results are ranked by relevance and paged by number; the
+    # full list is paged by (name, id) so deep pages cost the same as the first
+    if search:
+        products = search_products(query, search).paginate(page=page, per_page=per_page)
+    else:
+        total = cached_count(('products', category), query)
+        try:
+            products = keyset_paginate(query, [Product.name, Product.id], per_page, cursor=cursor, total=total)
+        except ValueError:
+            flash('Invalid page link', 'warning')
+            products = keyset_paginate(query, [Product.name, Product.id], per_page, total=total)
     
     return render_template('product/list.html', 
                           products=products, 
@@ -44,21 +56,46 @@ def list():
                           category=category,
                           categories=categories)
 
+@bp.route('/lookup')
+@login_required
+def lookup():
+    """Typeahead product lookup; returns one page of matches as JSON."""
+    term = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = current_app.config['TYPEAHEAD_PAGE_SIZE']
+    
+    query = db.session.query(Product.id, Product.name, Product.sku, Product.quantity)
+    
+    # Prefix matches from the search index, or the catalog by name
+    if term:
+        query = search_products(query, term)
+    else:
+        query = query.order_by(Product.name)
+    
+    # Fetch one extra row to know whether another page follows
+    rows = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+    
+    return jsonify({
+        'success': True,
+        'results': [
+            {'id': row.id, 'name': row.name, 'sku': row.sku, 'quantity': row.quantity}
+            for row in rows[:per_page]
+        ],
+        'page': page,
+        'has_more': len(rows) > per_page
+    })
+
 @bp.route('/view/<int:product_id>')
 @login_required
 def view(product_id):
     """View product details."""
     product = Product.query.get_or_404(product_id)
     
-    # Get all attributes
-    attributes = []
-    for attr in product.attributes:
-        definition = AttributeDefinition.query.get(attr.attribute_id)
-        attributes.append({
-            'name': definition.name,
-            'value': attr.value,
-            'type': definition.type
-        })
+    # Get all attributes with their definitions in one query
+    attributes = [
+        {'name': row.name, 'value': row.value, 'type': row.type}
+        for row in fetch_attribute_rows([product.id])
+    ]
     
     return render_template('product/view.html', product=product, attributes=attributes)
 
@@ -126,6 +163,7 @@ def add():
         db.session.flush()  # Get product ID without committing
         
         # Save product images
+        new_images = []
         images = request.files.getlist('images')
         for image in images:
             if image and image.filename:
@@ -139,6 +177,7 @@ def add():
                         is_featured=is_featured
                     )
                     db.session.add(product_image)
+                    new_images.append(product_image)
         
         # Save product attributes
         for attr_def in attribute_defs:
@@ -152,6 +191,12 @@ def add():
                 db.session.add(attr)
         
         db.session.commit()
+        invalidate_kpis()
+        forget_barcodes([new_product.barcode])
+        # The opening quantity has no log row; anchor the ledger at it
+        take_snapshots([new_product.id], verify=False)
+        # Thumbnails are resized in the background; the original shows until then
+        queue_image_variants([image.id for image in new_images], current_user.id)
         flash('Product added successfully', 'success')
         return redirect(url_for('products.view', product_id=new_product.id))
     
@@ -185,7 +230,7 @@ def edit(product_id):
         new_barcode = request.form.get('barcode')
         if new_barcode and new_barcode != product.barcode:
             product.barcode = new_barcode
-            
+        
         # Handle barcode image upload
         barcode_file = request.files.get('barcode_image')
         if barcode_file and barcode_file.filename:
@@ -193,6 +238,7 @@ def edit(product_id):
             # For now, we're not storing the barcode image path separately
         
         # Handle new images
+        new_images = []
         images = request.files.getlist('images')
         for image in images:
             if image and image.filename:
@@ -209,6 +255,7 @@ def edit(product_id):
                         is_featured=is_featured
                     )
                     db.session.add(product_image)
+                    new_images.append(product_image)
         
         # Update attributes
         for attr_def in attribute_defs:
@@ -237,6 +284,11 @@ def edit(product_id):
                 db.session.add(attr)
         
         db.session.commit()
+        invalidate_kpis()
+        # Drop the snapshot under the old barcode and any miss cached for the new one
+        forget_products([product.id])
+        forget_barcodes([product.barcode])
+        queue_image_variants([image.id for image in new_images], current_user.id)
         flash('Product updated successfully', 'success')
         return redirect(url_for('products.view', product_id=product.id))
     
@@ -261,18 +313,20 @@ def delete(product_id):
     
     product = Product.query.get_or_404(product_id)
     
-    # Delete product images from filesystem
-    for image in product.images:
-        try:
-            file_path = os.path.join(current_app.root_path, image.image_url)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception as e:
-            current_app.logger.error(f"Error deleting image: {e}")
+    # Image files may be shared with other products; note them before the rows go
+    files = {image.image_url: image.get_files() for image in product.images}
+    
+    # Rollup, snapshot and archived log rows can be many; delete them in bulk
+    # instead of loading them through the ORM
+    for model in (DailyMovement, StockSnapshot, ArchivedInventoryLog):
+        model.query.filter_by(product_id=product.id).delete(synchronize_session=False)
     
     # Delete product from database (cascade will delete related records)
     db.session.delete(product)
     db.session.commit()
+    release_images(files)
+    invalidate_kpis()
+    forget_products([product_id])
     
     flash('Product deleted successfully', 'success')
     return redirect(url_for('products.list'))
@@ -294,6 +348,7 @@ def set_featured_image(image_id):
     # Set this image as featured
     image.is_featured = True
     db.session.commit()
+    forget_products([product_id])
     
     return jsonify({'success': True})
 
@@ -324,17 +379,13 @@ def delete_image(image_id):
         if another_image:
             another_image.is_featured = True
     
-    # Delete file from filesystem
-    try:
-        file_path = os.path.join(current_app.root_path, image.image_url)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-    except Exception as e:
-        current_app.logger.error(f"Error deleting image file: {e}")
+    files = {image.image_url: image.get_files()}
     
-    # Delete from database
+    # Delete from database, then the files if no other image shares them
     db.session.delete(image)
     db.session.commit()
+    release_images(files)
+    forget_products([image.product_id])
     
     return jsonify({'success': True})
 
@@ -347,21 +398,13 @@ def search_by_barcode():
     if not barcode:
         return jsonify({'success': False, 'message': 'Barcode is required'}), 400
     
-    product = Product.query.filter_by(barcode=barcode).first()
+    # Cached snapshot; repeated scans of a barcode skip the database
+    snapshot = product_snapshot(barcode)
     
-    if not product:
+    if not snapshot:
         return jsonify({'success': False, 'message': 'Product not found'}), 404
     
     return jsonify({
         'success': True,
-        'product': {
-            'id': product.id,
-            'name': product.name,
-            'sku': product.sku,
-            'barcode': product.barcode,
-            'quantity': product.quantity,
-            'price': product.price_sell,
-            'image': product.get_main_image(),
-            'url': url_for('products.view', product_id=product.id)
-        }
+        'product': dict(snapshot, url=url_for('products.view', product_id=snapshot['id']))
     })
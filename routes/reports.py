@@ -1,11 +1,13 @@
 import os
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, current_app
-from flask_login import login_required
-from app import db
-from models import Product, InventoryLog
-from utils import generate_inventory_pdf, export_to_excel
-from datetime import datetime, timedelta
-import pandas as pd
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask_login import login_required, current_user
+from sqlalchemy.orm import selectinload
+from models import Product, DailyMovement, Job
+from utils import stream_csv_export
+from services.jobs import submit_job, resume_job
+from services.reports import month_range, get_category_stats, movement_trend
+from services.settings import get_setting
+from datetime import datetime
 
 bp = Blueprint('reports', __name__, url_prefix='/reports')
 
@@ -29,48 +31,34 @@ def inventory():
         if category:
             query = query.filter_by(category=category)
         
-        products = query.order_by(Product.name).all()
+        query = query.order_by(Product.name)
         
-        if not products:
+        if query.first() is None:
             flash('No products found for the selected criteria', 'warning')
             return redirect(url_for('reports.inventory'))
         
-        if report_type == 'pdf':
-            # Generate PDF report
-            filename = f"inventory_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            pdf_path = generate_inventory_pdf(products, filename)
-            
-            return send_file(pdf_path, as_attachment=True)
-        else:
-            # Generate Excel report
-            filename = f"inventory_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            excel_path = export_to_excel(products, filename)
-            
-            return send_file(excel_path, as_attachment=True)
-    
-    # Get categories for filter dropdown
-    categories = db.session.query(Product.category).distinct().all()
-    categories = [c[0] for c in categories if c[0]]
-    
-    # Calculate inventory stats by category
-    category_stats = {}
-    total_stats = {'count': 0, 'quantity': 0, 'value': 0}
-    
-    for category in categories:
-        products = Product.query.filter_by(category=category).all()
-        count = len(products)
-        quantity = sum(p.quantity for p in products)
-        value = sum(p.price_sell * p.quantity for p in products)
+        if report_type == 'csv':
+            # Stream CSV report straight to the browser
+            filename = f"inventory_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            return stream_csv_export(query, filename)
         
-        category_stats[category] = {
-            'count': count,
-            'quantity': quantity,
-            'value': value
-        }
+        # Build PDF or Excel report in the background
+        job = submit_job('inventory_report', {
+            'category': category,
+            'report_type': 'pdf' if report_type == 'pdf' else 'excel'
+        }, current_user.id)
         
-        total_stats['count'] += count
-        total_stats['quantity'] += quantity
-        total_stats['value'] += value
+        return _job_response(job)
+    
+    # Calculate inventory stats by category in a single aggregate query
+    category_stats = get_category_stats()
+    categories = list(category_stats)
+    
+    total_stats = {
+        'count': sum(stats['count'] for stats in category_stats.values()),
+        'quantity': sum(stats['quantity'] for stats in category_stats.values()),
+        'value': sum(stats['value'] for stats in category_stats.values())
+    }
     
     # Get data for the pie chart
     category_quantities = [stats['quantity'] for stats in category_stats.values()]
@@ -97,139 +85,29 @@ def monthly():
         
         try:
             # Create date range for the selected month
-            start_date = datetime(int(year), int(month), 1)
-            if int(month) == 12:
-                end_date = datetime(int(year) + 1, 1, 1) - timedelta(days=1)
-            else:
-                end_date = datetime(int(year), int(month) + 1, 1) - timedelta(days=1)
+            start_date, end_date = month_range(year, month)
         except ValueError:
             flash('Invalid month or year', 'danger')
             return redirect(url_for('reports.monthly'))
         
-        # Get inventory logs for the selected month
-        logs = InventoryLog.query.filter(
-            InventoryLog.created_at.between(start_date, end_date)
-        ).order_by(InventoryLog.created_at).all()
+        # Check for inventory logs in the selected month
+        has_logs = DailyMovement.query.filter(
+            DailyMovement.day >= start_date.date(),
+            DailyMovement.day < end_date.date()
+        ).first()
         
-        if not logs:
+        if not has_logs:
             flash('No inventory movements found for the selected month', 'warning')
             return redirect(url_for('reports.monthly'))
         
-        # Organize data by product
-        product_movements = {}
-        
-        for log in logs:
-            product = Product.query.get(log.product_id)
-            if not product:
-                continue
-                
-            if product.id not in product_movements:
-                product_movements[product.id] = {
-                    'sku': product.sku,
-                    'name': product.name,
-                    'category': product.category,
-                    'stock_in': 0,
-                    'stock_out': 0,
-                    'adjustments': 0,
-                    'net_change': 0
-                }
-            
-            if log.action_type == 'in':
-                product_movements[product.id]['stock_in'] += log.quantity
-                product_movements[product.id]['net_change'] += log.quantity
-            elif log.action_type == 'out':
-                product_movements[product.id]['stock_out'] += log.quantity
-                product_movements[product.id]['net_change'] -= log.quantity
-            elif log.action_type == 'adjust':
-                product_movements[product.id]['adjustments'] += log.quantity
-                product_movements[product.id]['net_change'] += log.quantity
+        # Build PDF or Excel report in the background
+        job = submit_job('monthly_report', {
+            'year': int(year),
+            'month': int(month),
+            'report_type': 'pdf' if report_type == 'pdf' else 'excel'
+        }, current_user.id)
         
-        # Create DataFrame for easy export
-        df = pd.DataFrame.from_dict(product_movements, orient='index')
-        
-        # Generate file path and folder
-        os.makedirs(os.path.join(current_app.config['UPLOAD_FOLDER'], 'reports'), exist_ok=True)
-        
-        if report_type == 'pdf':
-            # Generate PDF report
-            filename = f"monthly_report_{year}_{month}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'reports', filename)
-            
-            # Create PDF with ReportLab
-            from reportlab.lib.pagesizes import letter
-            from reportlab.lib import colors
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet
-            
-            doc = SimpleDocTemplate(file_path, pagesize=letter)
-            elements = []
-            
-            # Title
-            styles = getSampleStyleSheet()
-            month_name = datetime(int(year), int(month), 1).strftime('%B')
-            elements.append(Paragraph(f"Monthly Inventory Report - {month_name} {year}", styles['Heading1']))
-            elements.append(Spacer(1, 20))
-            
-            # Summary Table
-            data = [['SKU', 'Product Name', 'Category', 'Stock In', 'Stock Out', 'Adjustments', 'Net Change']]
-            
-            for product_id, movement in product_movements.items():
-                data.append([
-                    movement['sku'],
-                    movement['name'],
-                    movement['category'],
-                    movement['stock_in'],
-                    movement['stock_out'],
-                    movement['adjustments'],
-                    movement['net_change']
-                ])
-            
-            # Add totals row
-            totals = ['TOTAL', '', '']
-            totals.append(sum(m['stock_in'] for m in product_movements.values()))
-            totals.append(sum(m['stock_out'] for m in product_movements.values()))
-            totals.append(sum(m['adjustments'] for m in product_movements.values()))
-            totals.append(sum(m['net_change'] for m in product_movements.values()))
-            data.append(totals)
-            
-            # Create and style table
-            table = Table(data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ]))
-            
-            elements.append(table)
-            
-            # Build PDF
-            doc.build(elements)
-        else:
-            # Export to Excel
-            filename = f"monthly_report_{year}_{month}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'reports', filename)
-            
-            # Add totals row
-            df.loc['TOTAL'] = [
-                'TOTAL',
-                'Total',
-                'All Categories',
-                df['stock_in'].sum(),
-                df['stock_out'].sum(),
-                df['adjustments'].sum(),
-                df['net_change'].sum()
-            ]
-            
-            # Export to Excel
-            df.to_excel(file_path)
-        
-        return send_file(file_path, as_attachment=True)
+        return _job_response(job)
     
     # Get current month and year for default selection
     current_month = datetime.now().month
@@ -241,42 +119,100 @@ def monthly():
     # Create year choices (last 5 years)
     years = list(range(current_year - 4, current_year + 1))
     
+    # In/out totals of the last 12 months for the trend chart
+    movement_data = movement_trend(12)
+    
     return render_template('reports/monthly.html', 
                           months=months, 
                           years=years,
                           current_month=current_month,
-                          current_year=current_year)
+                          current_year=current_year,
+                          movement_data=movement_data)
 
 @bp.route('/low-stock')
 @login_required
 def low_stock():
     """Generate low stock report."""
-    threshold = request.args.get('threshold', 10, type=int)
+    threshold = request.args.get('threshold', get_setting('low_stock_threshold'), type=int)
     report_type = request.args.get('report_type', 'html')
     
-    # Get low stock products
-    low_stock_products = Product.query.filter(
+    # Low stock products
+    query = Product.query.filter(
         Product.quantity <= threshold
-    ).order_by(Product.quantity).all()
+    ).order_by(Product.quantity)
+    
+    if report_type in ('pdf', 'excel'):
+        # Build PDF or Excel report in the background
+        job = submit_job('low_stock_report', {
+            'threshold': threshold,
+            'report_type': report_type
+        }, current_user.id)
+        
+        return _job_response(job)
+    elif report_type == 'csv':
+        # Stream CSV report straight to the browser
+        filename = f"low_stock_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        return stream_csv_export(query, filename)
+    
+    # HTML report; images are batch-loaded for the thumbnails
+    low_stock_products = query.options(selectinload(Product.images)).all()
     
-    if not low_stock_products and report_type == 'html':
+    if not low_stock_products:
         flash('No low stock products found', 'info')
         return render_template('reports/low_stock.html', threshold=threshold)
     
-    if report_type == 'pdf':
-        # Generate PDF report
-        filename = f"low_stock_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        pdf_path = generate_inventory_pdf(low_stock_products, filename)
-        
-        return send_file(pdf_path, as_attachment=True)
-    elif report_type == 'excel':
-        # Generate Excel report
-        filename = f"low_stock_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        excel_path = export_to_excel(low_stock_products, filename)
-        
-        return send_file(excel_path, as_attachment=True)
-    else:
-        # HTML report
-        return render_template('reports/low_stock.html', 
-                              products=low_stock_products,
-                              threshold=threshold)
+    return render_template('reports/low_stock.html', 
+                          products=low_stock_products,
+                          threshold=threshold)
+
+def _visible_job(job_id):
+    """Return a job the current user started (any job for admins), or 404."""
+    query = Job.query.filter_by(id=job_id)
+    if not current_user.is_admin():
+        query = query.filter_by(created_by=current_user.id)
+    return query.first_or_404()
+
+@bp.route('/jobs/<int:job_id>')
+@login_required
+def job(job_id):
+    """Show the progress of a background report job."""
+    job = _visible_job(job_id)
+    return render_template('reports/job.html', job=job)
+
+@bp.route('/jobs/<int:job_id>/status')
+@login_required
+def job_status(job_id):
+    """Get the status of a background job."""
+    job = _visible_job(job_id)
+    
+    # Pick up a resumable job whose worker died
+    resume_job(job)
+    
+    download_url = None
+    if job.status == 'done' and job.result_path:
+        download_url = url_for('static', filename=os.path.relpath(job.result_path, 'static'))
+    
+    return jsonify({
+        'success': True,
+        'job': {
+            'id': job.id,
+            'kind': job.kind,
+            'status': job.status,
+            'progress': job.progress,
+            'total': job.total,
+            'error': job.error,
+            'checkpoint': job.get_checkpoint(),
+            'download_url': download_url
+        }
+    })
+
+def _job_response(job):
+    """Return the job id to API clients, or send browsers to the job page."""
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': url_for('reports.job_status', job_id=job.id)
+        }), 202
+    
+    return redirect(url_for('reports.job', job_id=job.id))
@@ -0,0 +1,80 @@
+"""Inventory log archival.
+
+Scanners add rows to ``inventory_log`` all day and old ones are hardly
+read again, so rows older than INVENTORY_LOG_ARCHIVE_DAYS are moved to
+``inventory_log_archive`` (``archive_inventory_logs.py``, meant to run
+nightly). The hot table and its indexes then stay the size of the
+horizon, whatever the history.
+
+The archive keeps the original ids, and the cutoff is the start of a
+month, so every archived row sorts below every live one by
+(created_at, id). The history page pages both tables as one (see
+``keyset_paginate_partitions``); reports read the daily rollup, which
+already covers archived days, and ``services/snapshots.py`` sums both
+tables.
+"""
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import insert, delete, select
+from flask import current_app
+from app import db
+from models import InventoryLog, ArchivedInventoryLog
+from services.snapshots import take_snapshots
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = ['id', 'product_id', 'action_type', 'quantity', 'reason', 'created_by', 'created_at']
+
+def archive_cutoff(days=None):
+    """Return the first day of the month ``days`` ago, as a datetime."""
+    if days is None:
+        days = current_app.config['INVENTORY_LOG_ARCHIVE_DAYS']
+    when = datetime.utcnow() - timedelta(days=days)
+    return datetime(when.year, when.month, 1)
+
+def archive_horizon():
+    """Return the ``created_at`` of the newest archived row, or None."""
+    return db.session.query(db.func.max(ArchivedInventoryLog.created_at)).scalar()
+
+def archive_logs(days=None):
+    """Move log rows from before ``archive_cutoff(days)`` to the archive.
+    
+    Commits every ARCHIVE_BATCH_SIZE rows, so it can be interrupted and
+    run again. Returns the number of rows moved.
+    """
+    cutoff = archive_cutoff(days)
+    
+    # Keep the newest row: SQLite would hand its id out again once it is gone
+    newest = db.session.query(InventoryLog.created_at).order_by(InventoryLog.id.desc()).limit(1).scalar()
+    if newest is None:
+        return 0
+    cutoff = min(cutoff, newest)
+    
+    # Snapshots taken now include every row about to move
+    take_snapshots()
+    
+    batch_size = current_app.config['ARCHIVE_BATCH_SIZE']
+    moved = 0
+    
+    while True:
+        ids = db.session.query(InventoryLog.id).filter(
+            InventoryLog.created_at < cutoff
+        ).order_by(InventoryLog.id).limit(batch_size).all()
+        if not ids:
+            break
+        
+        batch = [InventoryLog.created_at < cutoff, InventoryLog.id <= ids[-1][0]]
+        try:
+            db.session.execute(insert(ArchivedInventoryLog).from_select(
+                _COLUMNS, select(*[getattr(InventoryLog, column) for column in _COLUMNS]).where(*batch)
+            ))
+            db.session.execute(delete(InventoryLog).where(*batch))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        moved += len(ids)
+        logger.info(f"Archived {moved} inventory log rows older than {cutoff:%Y-%m-%d}")
+    
+    return moved
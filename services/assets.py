@@ -0,0 +1,171 @@
+"""Cache-friendly static files.
+
+``url_for('static', filename=...)`` emits fingerprinted URLs such as
+``js/inventory.3f9a0c1e2b4d.js``: the name carries a hash of the file's
+bytes, so the response can be cached for a year and a changed file simply
+gets a new URL. Uploaded images are stored under their SHA-256 already
+(``utils.store_upload``) and are served the same way without renaming.
+
+Anything requested by its plain name is served with ``no-cache``, so the
+browser revalidates it with the ETag / Last-Modified headers. CSS, JS and
+SVG files are served from ``.br`` / ``.gz`` copies next to them when the
+client accepts them; ``compress_static.py`` writes those copies.
+"""
+import os
+import re
+import gzip
+import uuid
+import hashlib
+import mimetypes
+from flask import current_app, request, send_from_directory
+from werkzeug.security import safe_join
+from werkzeug.exceptions import NotFound
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip copies are still used
+    brotli = None
+
+# name.<12 hex digits>.ext as produced by fingerprint()
+_FINGERPRINTED = re.compile(r'^(?P<stem>.+)\.(?P<digest>[0-9a-f]{12})(?P<ext>\.[^./]+)$')
+
+# Files named by their SHA-256, optionally with a variant suffix
+_CONTENT_ADDRESSED = re.compile(r'(^|/)[0-9a-f]{64}(_\w+)?\.\w+$')
+
+# Precompressed copies, best first
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+# filename -> (mtime, size, digest)
+_digests = {}
+
+def _digest(path):
+    stat = os.stat(path)
+    cached = _digests.get(path)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(block)
+    
+    digest = digest.hexdigest()[:12]
+    _digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+def _static_path(filename):
+    path = safe_join(current_app.static_folder, filename)
+    return path if path and os.path.isfile(path) else None
+
+def fingerprint(filename):
+    """Return the fingerprinted name of a static file.
+    
+    Content-addressed uploads and missing files keep their name.
+    """
+    if _CONTENT_ADDRESSED.search(filename):
+        return filename
+    
+    path = _static_path(filename)
+    if path is None:
+        return filename
+    
+    stem, ext = os.path.splitext(filename)
+    return f'{stem}.{_digest(path)}{ext}'
+
+def fingerprint_static_urls(endpoint, values):
+    """``url_defaults`` hook: fingerprint ``url_for('static', ...)`` URLs."""
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = fingerprint(values['filename'])
+
+def _precompressed(filename):
+    """Return ``(encoding, filename)`` of the best copy the client accepts."""
+    if os.path.splitext(filename)[1] not in current_app.config['PRECOMPRESS_EXTENSIONS']:
+        return None, filename
+    
+    source = _static_path(filename)
+    for encoding, suffix in ENCODINGS:
+        if encoding in request.accept_encodings:
+            path = _static_path(filename + suffix)
+            # Ignore copies older than the file they were made from
+            if path and os.stat(path).st_mtime >= os.stat(source).st_mtime:
+                return encoding, filename + suffix
+    
+    return None, filename
+
+def send_static_file(filename):
+    """Serve a static file with long-lived caching where the URL allows it."""
+    immutable = bool(_CONTENT_ADDRESSED.search(filename))
+    
+    if not _static_path(filename):
+        match = _FINGERPRINTED.match(filename)
+        if not match:
+            raise NotFound()
+        
+        filename = match['stem'] + match['ext']
+        if not _static_path(filename):
+            raise NotFound()
+        
+        # An old fingerprint still gets the current file, just not cached for long
+        immutable = fingerprint(filename) == match.group(0)
+    
+    encoding, served = _precompressed(filename)
+    mimetype = mimetypes.guess_type(filename)[0]
+    
+    response = send_from_directory(current_app.static_folder, served, mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if os.path.splitext(filename)[1] in current_app.config['PRECOMPRESS_EXTENSIONS']:
+        response.vary.add('Accept-Encoding')
+    
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config['STATIC_MAX_AGE']
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    
+    return response
+
+def compress_static_files(force=False):
+    """Write ``.gz`` (and ``.br`` if brotli is installed) copies of CSS/JS.
+    
+    Each copy is replaced atomically. Returns the number of copies written.
+    """
+    extensions = tuple(current_app.config['PRECOMPRESS_EXTENSIONS'])
+    written = 0
+    
+    for folder, _, filenames in os.walk(current_app.static_folder):
+        # Uploads are images and spreadsheets; nothing to gain
+        if os.path.relpath(folder, current_app.static_folder).split(os.sep)[0] == 'uploads':
+            continue
+        
+        for filename in filenames:
+            if not filename.endswith(extensions):
+                continue
+            
+            path = os.path.join(folder, filename)
+            with open(path, 'rb') as f:
+                data = f.read()
+            
+            copies = [('.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                copies.append(('.br', lambda: brotli.compress(data, quality=11)))
+            
+            for suffix, compress in copies:
+                target = path + suffix
+                if force or not os.path.exists(target) or os.stat(target).st_mtime < os.stat(path).st_mtime:
+                    # Every worker runs this at startup; write to a temporary name and swap it
+                    # in, so nobody serves a half-written copy that is already newer than the source
+                    temp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+                    try:
+                        with open(temp_path, 'wb') as f:
+                            f.write(compress())
+                        os.replace(temp_path, target)
+                    except OSError:
+                        if os.path.exists(temp_path):
+                            os.remove(temp_path)
+                        raise
+                    written += 1
+    
+    return written
@@ -0,0 +1,74 @@
+"""Bulk loading of dynamic product attribute values.
+
+Attribute values live in ``ProductAttribute`` rows keyed by product and
+attribute definition. These helpers fetch them for a whole set of
+products in one query per chunk instead of one query per
+(product, attribute) pair.
+"""
+import pandas as pd
+from sqlalchemy import select
+from app import db
+from models import AttributeDefinition, ProductAttribute
+
+# Keep IN lists well below SQLite's bound-parameter limit
+CHUNK_SIZE = 500
+
+def fetch_attribute_rows(product_ids, names=None, connection=None):
+    """Return ``(product_id, name, type, value)`` rows for the given products.
+    
+    ``names`` optionally restricts the result to those attribute names.
+    ``connection`` runs the queries outside the ORM session, for callers
+    that are still streaming another result on the session's connection.
+    """
+    product_ids = list(product_ids)
+    executor = connection if connection is not None else db.session
+    rows = []
+    
+    for start in range(0, len(product_ids), CHUNK_SIZE):
+        stmt = select(
+            ProductAttribute.product_id,
+            AttributeDefinition.name,
+            AttributeDefinition.type,
+            ProductAttribute.value
+        ).join(
+            AttributeDefinition, ProductAttribute.attribute_id == AttributeDefinition.id
+        ).where(
+            ProductAttribute.product_id.in_(product_ids[start:start + CHUNK_SIZE])
+        )
+        
+        if names is not None:
+            stmt = stmt.where(AttributeDefinition.name.in_(names))
+        
+        stmt = stmt.order_by(ProductAttribute.product_id, AttributeDefinition.id)
+        rows.extend(executor.execute(stmt).all())
+    
+    return rows
+
+def attribute_names(connection=None):
+    """Return every attribute definition name, in definition order."""
+    executor = connection if connection is not None else db.session
+    stmt = select(AttributeDefinition.name).order_by(AttributeDefinition.id)
+    return list(executor.execute(stmt).scalars())
+
+def attribute_pivot(product_ids, columns=None, connection=None):
+    """Return a wide DataFrame of attribute values indexed by product id.
+    
+    There is one column per attribute definition, in definition order,
+    including attributes no product in the set uses; pass ``columns`` to
+    reuse a name list across calls. Missing values are empty strings.
+    """
+    product_ids = list(product_ids)
+    if columns is None:
+        columns = attribute_names(connection)
+    
+    rows = fetch_attribute_rows(product_ids, connection=connection)
+    long_df = pd.DataFrame(
+        [(r.product_id, r.name, r.value) for r in rows],
+        columns=['product_id', 'name', 'value']
+    )
+    
+    pivot = long_df.pivot_table(
+        index='product_id', columns='name', values='value', aggfunc='first'
+    )
+    
+    return pivot.reindex(index=product_ids, columns=columns).fillna('')
@@ -0,0 +1,72 @@
+"""Cached barcode lookups for the scanner endpoints.
+
+Scanner stations resolve the same barcodes many times per second, so the
+compact product snapshot they need (id, name, SKU, quantity, price, main
+image) is kept in a per-process LRU cache, unknown barcodes included.
+
+Writes drop the affected entries: stock movements and product edits by
+product id, imports by clearing the whole cache. Other gunicorn workers
+keep their copy until it expires after BARCODE_CACHE_TTL seconds, so a
+snapshot's quantity may briefly lag behind; stock-outs are still checked
+against the database row.
+"""
+from sqlalchemy.orm import selectinload
+from config import Config
+from models import Product
+from services.cache import TTLCache
+
+_cache = TTLCache(maxsize=Config.BARCODE_CACHE_SIZE, ttl=Config.BARCODE_CACHE_TTL)
+
+# Barcode of each cached product, so entries can be dropped by product id
+_barcodes = {}
+
+_NOT_FOUND = object()
+
+def make_snapshot(product):
+    """Return the compact snapshot dict the scanner endpoints send."""
+    return {
+        'id': product.id,
+        'name': product.name,
+        'sku': product.sku,
+        'barcode': product.barcode,
+        'quantity': product.quantity,
+        'price': product.price_sell,
+        'image': product.get_main_image('medium')
+    }
+
+def product_snapshot(barcode):
+    """Return the snapshot dict for a barcode, or None if no product has it."""
+    entry = _cache.get(barcode, _NOT_FOUND)
+    if entry is not _NOT_FOUND:
+        return entry
+    
+    product = Product.query.options(selectinload(Product.images)).filter_by(barcode=barcode).first()
+    snapshot = make_snapshot(product) if product else None
+    
+    if product:
+        if len(_barcodes) > 2 * _cache.maxsize:
+            # Evicted entries leave stale ids behind; start over now and then
+            clear_barcode_cache()
+        _barcodes[product.id] = barcode
+    _cache.set(barcode, snapshot)
+    
+    return snapshot
+
+def forget_barcodes(barcodes):
+    """Drop cached lookups for these barcodes."""
+    for barcode in barcodes:
+        if barcode:
+            _cache.pop(barcode)
+
+def forget_products(product_ids):
+    """Drop cached snapshots of these products."""
+    forget_barcodes([_barcodes.pop(product_id, None) for product_id in product_ids])
+
+def clear_barcode_cache():
+    """Drop every cached lookup."""
+    _cache.clear()
+    _barcodes.clear()
+
+def barcode_cache_stats():
+    """Return size and hit/miss counters of the barcode cache."""
+    return _cache.stats()
@@ -0,0 +1,167 @@
+"""Product image variants.
+
+Uploads are stored as they come in; the resizing happens off-request in
+the ``image_variants`` background job, which writes a thumbnail and a
+medium-size copy of every image, each in the original format and as
+WebP, next to the original. The variant paths are recorded on
+``ProductImage.variants`` and templates pick the smallest one that fits
+(see ``templates/macros/images.html``). Until the job has run, the
+original is served.
+
+Originals are stored under their content hash (``utils.store_upload``),
+so several ProductImage rows can share one file and its variants. Files
+are deleted once the last row using them goes (``release_images``),
+unless just uploaded again; anything else left behind is removed by
+``collect_garbage``.
+"""
+import os
+import json
+import time
+import logging
+from PIL import Image, ImageOps
+from flask import current_app
+from app import db
+from models import ProductImage
+from services.jobs import job_handler, submit_job
+from services.barcodes import forget_products
+
+logger = logging.getLogger(__name__)
+
+# PIL format and file extension used for a variant of each upload type
+VARIANT_FORMATS = {
+    'jpg': ('JPEG', 'jpg'),
+    'jpeg': ('JPEG', 'jpg'),
+    'png': ('PNG', 'png'),
+    'gif': ('PNG', 'png')
+}
+
+def _save(img, path, fmt):
+    if fmt == 'JPEG':
+        img.convert('RGB').save(path, fmt, quality=85, optimize=True, progressive=True)
+    elif fmt == 'WEBP':
+        img.save(path, fmt, quality=80, method=4)
+    else:
+        img.save(path, fmt, optimize=True)
+
+def build_variants(image):
+    """Write every variant of a ProductImage and record their paths.
+    
+    Does not commit. Returns the variants dict.
+    """
+    original = image.image_url
+    stem, extension = os.path.splitext(original)
+    fmt, variant_ext = VARIANT_FORMATS.get(extension.lstrip('.').lower(), ('PNG', 'png'))
+    
+    with Image.open(os.path.join(current_app.root_path, original)) as source:
+        # Apply the camera's orientation before resizing; keep alpha for PNG and WebP
+        img = ImageOps.exif_transpose(source)
+        img = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        
+        variants = {}
+        for size, box in current_app.config['IMAGE_VARIANT_SIZES'].items():
+            resized = img.copy()
+            resized.thumbnail((box, box), Image.LANCZOS)
+            
+            for key, variant_fmt, ext in ((size, fmt, variant_ext), (f'{size}_webp', 'WEBP', 'webp')):
+                path = f'{stem}_{size}.{ext}'
+                file_path = os.path.join(current_app.root_path, path)
+                # A shared original already has its variants
+                if not os.path.exists(file_path):
+                    _save(resized, file_path, variant_fmt)
+                variants[key] = path
+    
+    image.variants = json.dumps(variants)
+    return variants
+
+@job_handler('image_variants')
+def build_image_variants(job, params):
+    """Build variants for the images in ``params['image_ids']``."""
+    images = ProductImage.query.filter(ProductImage.id.in_(params['image_ids'])).all()
+    
+    for image in images:
+        try:
+            build_variants(image)
+        except (OSError, ValueError) as e:
+            # A broken upload keeps serving its original
+            logger.error(f"Image variant error for {image.image_url}: {e}")
+        db.session.commit()
+    
+    # Scanner snapshots carry the main image path
+    forget_products({image.product_id for image in images})
+    return None
+
+def queue_image_variants(image_ids, user_id):
+    """Queue variant generation for newly saved images."""
+    if image_ids:
+        submit_job('image_variants', {'image_ids': sorted(image_ids)}, user_id)
+
+def _remove(path):
+    try:
+        file_path = os.path.join(current_app.root_path, path)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    except OSError as e:
+        logger.error(f"Error deleting image file {path}: {e}")
+
+def release_images(files):
+    """Delete the files of removed images that no other row still uses.
+    
+    ``files`` maps each removed row's ``image_url`` to its ``get_files()``;
+    collect it before deleting the rows and call this after the commit.
+    Like ``collect_garbage``, originals stored or reused within
+    IMAGE_GC_GRACE seconds are kept, for an upload whose row is not
+    committed yet; ``collect_garbage`` removes them later if still unused.
+    """
+    in_use = {
+        url for (url,) in db.session.query(ProductImage.image_url).filter(
+            ProductImage.image_url.in_(list(files))
+        ).distinct()
+    }
+    
+    cutoff = time.time() - current_app.config['IMAGE_GC_GRACE']
+    for url, paths in files.items():
+        if url in in_use:
+            continue
+        try:
+            if os.path.getmtime(os.path.join(current_app.root_path, url)) > cutoff:
+                continue
+        except OSError:
+            pass
+        for path in paths:
+            _remove(path)
+
+def collect_garbage(dry_run=False):
+    """Delete image files that no ProductImage row references.
+    
+    Files younger than IMAGE_GC_GRACE seconds are kept, since an upload is
+    stored before its row is committed. Returns ``(files, bytes)`` removed,
+    or that would be removed with ``dry_run``.
+    """
+    referenced = set()
+    for url, variants in db.session.query(ProductImage.image_url, ProductImage.variants):
+        referenced.add(os.path.normpath(url))
+        if variants:
+            referenced.update(os.path.normpath(path) for path in json.loads(variants).values())
+    
+    cutoff = time.time() - current_app.config['IMAGE_GC_GRACE']
+    images_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'images')
+    removed = size = 0
+    
+    for folder, _, filenames in os.walk(os.path.join(current_app.root_path, images_folder)):
+        for filename in filenames:
+            file_path = os.path.join(folder, filename)
+            path = os.path.relpath(file_path, current_app.root_path)
+            if path in referenced:
+                continue
+            
+            stat = os.stat(file_path)
+            if stat.st_mtime > cutoff:
+                continue
+            
+            removed += 1
+            size += stat.st_size
+            if not dry_run:
+                _remove(path)
+                logger.info(f"Removed unreferenced image {path}")
+    
+    return removed, size
@@ -0,0 +1,271 @@
+"""Bulk product import.
+
+Rows parsed by ``utils.iter_import_batches`` are upserted by SKU in chunks:
+existing SKU and attribute ids are preloaded once, each chunk is split
+into inserts and updates written with ``bulk_insert_mappings`` and
+``bulk_update_mappings``, and every chunk is committed on its own. A
+chunk that violates a constraint (e.g. a duplicate barcode) is retried
+row by row so only the offending rows are counted as errors. Failing
+rows are kept with their reason in ``failures``.
+
+Large files are imported by the ``product_import`` background job, which
+checkpoints after every chunk so a restarted job skips what is already
+committed. Upserts are keyed by SKU, so a chunk that was committed just
+before a crash but not yet checkpointed is simply written again.
+"""
+import os
+import csv
+import time
+import logging
+import pandas as pd
+from datetime import datetime
+from itertools import islice
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from models import Product, AttributeDefinition, ProductAttribute
+from services.jobs import job_handler, update_progress
+from services.kpi import invalidate_kpis
+from services.barcodes import clear_barcode_cache
+from services.snapshots import take_snapshots
+from utils import iter_import_batches, count_import_rows
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_FIELDS = ['name', 'barcode', 'category', 'size', 'color', 'gender',
+                  'material', 'price_cost', 'price_sell', 'quantity', 'location']
+
+class ProductImporter:
+    """Upsert parsed product rows in committed chunks."""
+    
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or current_app.config['IMPORT_CHUNK_SIZE']
+        self.imported = 0
+        self.updated = 0
+        self.errors = 0
+        self.elapsed = 0.0
+        self.failures = []
+        
+        # One query each for the existing SKU and attribute id maps
+        self.sku_ids = dict(db.session.query(Product.sku, Product.id))
+        self.attribute_ids = dict(db.session.query(AttributeDefinition.name, AttributeDefinition.id))
+    
+    @property
+    def rows_per_second(self):
+        total = self.imported + self.updated + self.errors
+        return total / self.elapsed if self.elapsed else 0.0
+    
+    def run(self, records):
+        """Import every record; returns self for the counters."""
+        started = time.perf_counter()
+        records = iter(records)
+        
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk)
+        
+        self.elapsed = time.perf_counter() - started
+        logger.info(f"Imported {self.imported}, updated {self.updated}, errors {self.errors} "
+                    f"in {self.elapsed:.1f}s ({self.rows_per_second:.0f} rows/s)")
+        return self
+    
+    def import_chunk(self, chunk):
+        """Write and commit one chunk, falling back to row by row on error."""
+        rejected = [record for record in chunk if record.get('error')]
+        if rejected:
+            for record in rejected:
+                self._fail(record, record['error'])
+            chunk = [record for record in chunk if not record.get('error')]
+            if not chunk:
+                return
+        
+        try:
+            inserted, updated, new_sku_ids, new_attribute_ids = self._write(chunk)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            if len(chunk) == 1:
+                logger.error(f"Import error for SKU {chunk[0]['sku']}: {e}")
+                self._fail(chunk[0], str(getattr(e, 'orig', None) or e))
+                return
+            for record in chunk:
+                self.import_chunk([record])
+            return
+        
+        # The new ids exist only now; after a rollback they would point at nothing
+        self.sku_ids.update(new_sku_ids)
+        self.attribute_ids.update(new_attribute_ids)
+        self.imported += inserted
+        self.updated += updated
+        
+        # Imported quantities have no log rows; anchor the ledger at them
+        take_snapshots([self.sku_ids[record['sku']] for record in chunk if record['sku'] in self.sku_ids], verify=False)
+    
+    def _fail(self, record, reason):
+        self.errors += 1
+        self.failures.append({
+            'row': record.get('row'),
+            'sku': record.get('sku'),
+            'name': record.get('name'),
+            'reason': reason
+        })
+    
+    def _write(self, chunk):
+        # A SKU repeated within the file keeps its last row
+        rows = {record['sku']: record for record in chunk}
+        now = datetime.utcnow()
+        
+        inserts = []
+        updates = []
+        for sku, record in rows.items():
+            values = {field: record[field] for field in PRODUCT_FIELDS}
+            if sku in self.sku_ids:
+                values.update(id=self.sku_ids[sku], updated_at=now)
+                updates.append(values)
+            else:
+                values.update(sku=sku, created_at=now, updated_at=now)
+                inserts.append(values)
+        
+        if inserts:
+            db.session.bulk_insert_mappings(Product, inserts)
+        if updates:
+            db.session.bulk_update_mappings(Product, updates)
+        
+        # Look up the new ids in one query instead of relying on RETURNING
+        new_ids = {}
+        if inserts:
+            new_ids = dict(db.session.query(Product.sku, Product.id).filter(
+                Product.sku.in_([values['sku'] for values in inserts])
+            ))
+        
+        product_ids = {sku: self.sku_ids.get(sku) or new_ids[sku] for sku in rows}
+        new_attribute_ids = self._write_attributes(rows, product_ids, bool(updates))
+        
+        return len(inserts), len(updates), new_ids, new_attribute_ids
+    
+    def _write_attributes(self, rows, product_ids, has_updates):
+        names = {name for record in rows.values() for name in record['attributes']}
+        missing = names - set(self.attribute_ids)
+        new_ids = {}
+        if missing:
+            db.session.bulk_insert_mappings(AttributeDefinition, [
+                {'name': name, 'type': 'text', 'required': False, 'created_at': datetime.utcnow()}
+                for name in sorted(missing)
+            ])
+            new_ids = dict(db.session.query(AttributeDefinition.name, AttributeDefinition.id).filter(
+                AttributeDefinition.name.in_(missing)
+            ))
+        attribute_ids = {**self.attribute_ids, **new_ids}
+        
+        # Existing values only matter for products that were already there
+        existing = {}
+        if has_updates:
+            existing = {
+                (product_id, attribute_id): attr_id
+                for attr_id, product_id, attribute_id in db.session.query(
+                    ProductAttribute.id, ProductAttribute.product_id, ProductAttribute.attribute_id
+                ).filter(ProductAttribute.product_id.in_(list(product_ids.values())))
+            }
+        
+        inserts = []
+        updates = []
+        for sku, record in rows.items():
+            product_id = product_ids[sku]
+            for name, value in record['attributes'].items():
+                key = (product_id, attribute_ids[name])
+                if key in existing:
+                    updates.append({'id': existing[key], 'value': value})
+                else:
+                    inserts.append({'product_id': product_id, 'attribute_id': key[1], 'value': value})
+        
+        if inserts:
+            db.session.bulk_insert_mappings(ProductAttribute, inserts)
+        if updates:
+            db.session.bulk_update_mappings(ProductAttribute, updates)
+        
+        return new_ids
+
+def import_products(records, chunk_size=None):
+    """Upsert parsed product records and return the finished importer."""
+    return ProductImporter(chunk_size).run(records)
+
+ERROR_SHEET_COLUMNS = ['Row', 'SKU', 'Name', 'Reason']
+
+def _append_failures(path, failures):
+    """Append failing rows to the job's CSV error log."""
+    new_file = not os.path.exists(path)
+    with open(path, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(ERROR_SHEET_COLUMNS)
+        for failure in failures:
+            writer.writerow([failure['row'], failure['sku'], failure['name'], failure['reason']])
+
+@job_handler('product_import', resumable=True)
+def run_import_job(job, params):
+    """Import an uploaded file chunk by chunk; returns the error sheet path, if any."""
+    file_path = params['path']
+    chunk_size = params['chunk_size']
+    checkpoint = job.get_checkpoint()
+    done = checkpoint.get('chunks', 0)
+    
+    importer = ProductImporter(chunk_size)
+    importer.imported = checkpoint.get('imported', 0)
+    importer.updated = checkpoint.get('updated', 0)
+    importer.errors = checkpoint.get('errors', 0)
+    # Time spent by earlier runs of a resumed job, for the throughput shown to the user
+    previous_elapsed = checkpoint.get('elapsed', 0.0)
+    
+    reports_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'reports')
+    os.makedirs(reports_folder, exist_ok=True)
+    error_log = os.path.join(reports_folder, f"import_errors_{job.id}.csv")
+    
+    started = time.perf_counter()
+    try:
+        total = job.total
+        if total is None:
+            total = count_import_rows(file_path)
+            update_progress(job, 0, total=total)
+        
+        for records in iter_import_batches(file_path, chunk_size, start=done):
+            importer.import_chunk(records)
+            
+            # Failures are logged before the checkpoint, so a resumed chunk may
+            # log its rows twice; the error sheet drops the duplicates
+            if importer.failures:
+                _append_failures(error_log, importer.failures)
+                importer.failures = []
+            
+            done += 1
+            importer.elapsed = previous_elapsed + time.perf_counter() - started
+            update_progress(job, min(done * chunk_size, total), checkpoint={
+                'chunks': done,
+                'imported': importer.imported,
+                'updated': importer.updated,
+                'errors': importer.errors,
+                'elapsed': round(importer.elapsed, 3),
+                'rows_per_second': round(importer.rows_per_second)
+            })
+    finally:
+        # A failed job is not retried, so the upload goes either way
+        if os.path.exists(file_path):
+            os.unlink(file_path)
+    
+    importer.elapsed = previous_elapsed + time.perf_counter() - started
+    logger.info(f"Import job {job.id}: imported {importer.imported}, updated {importer.updated}, "
+                f"errors {importer.errors} ({importer.rows_per_second:.0f} rows/s)")
+    invalidate_kpis()
+    clear_barcode_cache()
+    
+    if not os.path.exists(error_log):
+        return None
+    
+    filename = f"import_errors_{job.id}.xlsx"
+    errors = pd.read_csv(error_log, dtype=str).drop_duplicates(subset=['Row', 'Reason'])
+    errors = errors.sort_values('Row', key=lambda rows: pd.to_numeric(rows, errors='coerce'))
+    errors.to_excel(os.path.join(reports_folder, filename), index=False)
+    os.unlink(error_log)
+    
+    return os.path.join(reports_folder, filename)
@@ -0,0 +1,190 @@
+"""Background job runner.
+
+Jobs are rows in the ``job`` table, so any gunicorn worker can report
+their status, and run on a per-process thread pool. Handlers register
+themselves by kind with ``@job_handler``. Submitting a job whose kind and
+params match a pending or running job of the same user returns that job
+instead of starting a duplicate.
+
+Resumable handlers save a checkpoint with ``update_progress`` as they go.
+If the worker running one dies, ``resume_job`` hands the job to another
+worker once its heartbeat is older than JOB_HEARTBEAT_TIMEOUT, and the
+handler picks up from the saved checkpoint. The web process does this when
+a job's status is polled; ``resume_jobs.py`` does it for every stale job.
+"""
+import json
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import Job
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+RESUMABLE = set()
+
+_executor = None
+
+def job_handler(kind, resumable=False):
+    """Register a function as the handler for a job kind.
+    
+    The handler is called as ``handler(job, params)`` inside an app context
+    and returns the path of the file it produced, or None. A resumable
+    handler must continue from ``job.get_checkpoint()`` when restarted.
+    """
+    def decorator(func):
+        HANDLERS[kind] = func
+        if resumable:
+            RESUMABLE.add(kind)
+        return func
+    return decorator
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=current_app.config['JOB_WORKERS'],
+            thread_name_prefix='job'
+        )
+    return _executor
+
+def _heartbeat():
+    # Whole seconds, so the value compares equal after a MySQL DATETIME round trip
+    return datetime.utcnow().replace(microsecond=0)
+
+def _job_key(kind, params, user_id):
+    # Per user, since users can only see the jobs they started
+    payload = json.dumps([kind, params, user_id], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _expire_stale(key):
+    """Fail an unfinished job that has outlived JOB_TIMEOUT, freeing its key."""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['JOB_TIMEOUT'])
+    stale = Job.query.filter(Job.active_key == key, Job.created_at < cutoff).first()
+    if stale:
+        stale.status = 'failed'
+        stale.error = 'Job timed out'
+        stale.active_key = None
+        stale.finished_at = datetime.utcnow()
+        db.session.commit()
+
+def submit_job(kind, params, user_id):
+    """Queue a job and return it, or return the user's identical job already queued."""
+    if kind not in HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    
+    key = _job_key(kind, params, user_id)
+    _expire_stale(key)
+    
+    existing = Job.query.filter_by(active_key=key).first()
+    if existing:
+        return existing
+    
+    job = Job(
+        kind=kind,
+        params=json.dumps(params),
+        active_key=key,
+        status='pending',
+        created_by=user_id,
+        heartbeat_at=_heartbeat()
+    )
+    db.session.add(job)
+    
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request queued the same job between our check and insert
+        db.session.rollback()
+        return Job.query.filter_by(active_key=key).first()
+    
+    start_job(job.id, job.heartbeat_at)
+    return job
+
+def start_job(job_id, claimed_at):
+    """Hand a queued job to this process's thread pool.
+    
+    ``claimed_at`` is the job's heartbeat when this process claimed it; the
+    job only runs if nobody else has claimed it in the meantime.
+    """
+    app = current_app._get_current_object()
+    _get_executor().submit(_run_job, app, job_id, claimed_at)
+
+def update_progress(job, progress, total=None, checkpoint=None):
+    """Record a job's progress and heartbeat, and commit.
+    
+    ``checkpoint`` is the dict a resumable handler continues from after a
+    restart; commit it only once the work it describes is committed.
+    """
+    job.progress = progress
+    if total is not None:
+        job.total = total
+    if checkpoint is not None:
+        job.checkpoint = json.dumps(checkpoint)
+    job.heartbeat_at = _heartbeat()
+    db.session.commit()
+
+def _claim(job_id, claimed_at):
+    """Atomically take over a job whose heartbeat is still ``claimed_at``."""
+    now = _heartbeat()
+    claimed = Job.query.filter(
+        Job.id == job_id,
+        Job.heartbeat_at == claimed_at,
+        Job.status.in_(['pending', 'running'])
+    ).update({'heartbeat_at': now}, synchronize_session=False)
+    db.session.commit()
+    return now if claimed else None
+
+def resume_job(job):
+    """Restart an unfinished resumable job if its worker has gone quiet."""
+    if job.kind not in RESUMABLE or job.status not in ('pending', 'running'):
+        return False
+    
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['JOB_HEARTBEAT_TIMEOUT'])
+    if job.heartbeat_at is None or job.heartbeat_at >= cutoff:
+        return False
+    
+    claimed_at = _claim(job.id, job.heartbeat_at)
+    if claimed_at is None:
+        return False
+    
+    logger.info(f"Resuming job {job.id} ({job.kind}) from progress {job.progress}")
+    start_job(job.id, claimed_at)
+    return True
+
+def resume_stale_jobs():
+    """Restart every resumable job whose worker has gone quiet."""
+    jobs = Job.query.filter(
+        Job.kind.in_(RESUMABLE),
+        Job.status.in_(['pending', 'running'])
+    ).all()
+    return sum(resume_job(job) for job in jobs)
+
+def _run_job(app, job_id, claimed_at):
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        if job is None or job.heartbeat_at != claimed_at:
+            # Finished, or claimed by another worker while queued here
+            return
+        
+        job.status = 'running'
+        job.started_at = job.started_at or datetime.utcnow()
+        job.heartbeat_at = _heartbeat()
+        db.session.commit()
+        
+        try:
+            job.result_path = HANDLERS[job.kind](job, job.get_params())
+            job.status = 'done'
+        except Exception as e:
+            logger.exception(f"Job {job_id} ({job.kind}) failed")
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+        
+        job.active_key = None
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
@@ -0,0 +1,118 @@
+"""Cached dashboard KPIs.
+
+The product and movement KPIs shown on the main dashboard and the
+inventory page are computed with two aggregate queries and kept in a
+per-process TTL cache, as is the category list used by filter dropdowns.
+Stock movements, product edits and imports call ``invalidate_kpis()`` so
+dashboards never show stale numbers for longer than a request.
+
+With several gunicorn workers, set ``KPI_CACHE_FILE`` to a path all
+workers can reach. Invalidation then touches that file and each worker
+discards entries computed before the file's modification time.
+"""
+import os
+import time
+import datetime
+from flask import current_app
+from app import db
+from config import Config
+from models import Product, DailyMovement
+from services.cache import TTLCache
+
+_cache = TTLCache(maxsize=16, ttl=Config.KPI_CACHE_TTL)
+
+# Wall-clock time of the last invalidation seen by this process
+_invalidated_at = 0.0
+
+def _last_invalidation():
+    shared_file = current_app.config.get('KPI_CACHE_FILE')
+    if shared_file:
+        try:
+            return max(_invalidated_at, os.stat(shared_file).st_mtime)
+        except FileNotFoundError:
+            pass
+    return _invalidated_at
+
+def _compute_kpis(low_stock_threshold, today):
+    low_stock = db.case((Product.quantity <= low_stock_threshold, 1), else_=0)
+    out_of_stock = db.case((Product.quantity <= 0, 1), else_=0)
+    
+    products = db.session.query(
+        db.func.count(Product.id),
+        db.func.coalesce(db.func.sum(low_stock), 0),
+        db.func.coalesce(db.func.sum(out_of_stock), 0),
+        db.func.coalesce(db.func.sum(Product.price_sell * Product.quantity), 0),
+        db.func.coalesce(db.func.sum(Product.price_cost * Product.quantity), 0)
+    ).one()
+    
+    def action_sum(action_type):
+        return db.func.coalesce(db.func.sum(
+            db.case((DailyMovement.action_type == action_type, DailyMovement.quantity), else_=0)
+        ), 0)
+    
+    # Today's rollup rows rather than the day's log rows
+    movements = db.session.query(
+        action_sum('in'),
+        action_sum('out')
+    ).filter(
+        DailyMovement.day == today,
+        DailyMovement.action_type.in_(['in', 'out'])
+    ).one()
+    
+    return {
+        'total_products': products[0],
+        'low_stock_count': products[1],
+        'out_of_stock_count': products[2],
+        'inventory_value': products[3],
+        'inventory_cost': products[4],
+        'stock_in_today': movements[0],
+        'stock_out_today': movements[1]
+    }
+
+def get_kpis(low_stock_threshold):
+    """Return the dashboard KPIs, from cache when still fresh."""
+    # Rollup days are UTC dates
+    today = datetime.datetime.utcnow().date()
+    key = (low_stock_threshold, today)
+    
+    entry = _cache.get(key)
+    if entry is not None:
+        computed_at, kpis = entry
+        if computed_at > _last_invalidation():
+            return kpis
+    
+    # Stamp before querying so an invalidation during the query wins
+    computed_at = time.time()
+    kpis = _compute_kpis(low_stock_threshold, today)
+    _cache.set(key, (computed_at, kpis))
+    
+    return kpis
+
+def get_categories():
+    """Return the sorted distinct product categories, from cache when still fresh."""
+    entry = _cache.get('categories')
+    if entry is not None:
+        computed_at, categories = entry
+        if computed_at > _last_invalidation():
+            return categories
+    
+    computed_at = time.time()
+    categories = [
+        category for (category,) in
+        db.session.query(Product.category).distinct().order_by(Product.category)
+        if category
+    ]
+    _cache.set('categories', (computed_at, categories))
+    
+    return categories
+
+def invalidate_kpis():
+    """Discard cached KPIs in this process and, if configured, all workers."""
+    global _invalidated_at
+    _invalidated_at = time.time()
+    _cache.clear()
+    
+    shared_file = current_app.config.get('KPI_CACHE_FILE')
+    if shared_file:
+        with open(shared_file, 'a'):
+            os.utime(shared_file, None)
@@ -0,0 +1,140 @@
+"""Keyset (cursor) pagination.
+
+``keyset_paginate`` pages a query by its sort key instead of with OFFSET:
+each page asks for the rows after (or before) the last key the client
+saw, so any page costs one index range scan, however deep it is. The
+cursor handed to the client is an opaque token encoding that key.
+
+Totals come from ``cached_count``, which keeps each filtered COUNT for
+COUNT_CACHE_TTL seconds; pages show them as approximate.
+
+``keyset_paginate_partitions`` pages several queries whose key ranges do
+not overlap as if they were one, such as the live inventory log and its
+archive.
+"""
+import json
+import base64
+from datetime import datetime
+from config import Config
+from services.cache import TTLCache
+
+_counts = TTLCache(maxsize=256, ttl=Config.COUNT_CACHE_TTL)
+
+class KeysetPage:
+    """One page of a keyset-paginated query."""
+    
+    def __init__(self, items, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+    
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+    
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def _dump(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+def _load(value):
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+def encode_cursor(values, backwards=False):
+    """Encode a sort key as an opaque, URL-safe cursor."""
+    payload = json.dumps([backwards, [_dump(value) for value in values]])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Return ``(values, backwards)`` for a cursor; raises ValueError."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        backwards, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return [_load(value) for value in values], bool(backwards)
+    except (TypeError, KeyError, json.JSONDecodeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {cursor}') from e
+
+def _beyond(columns, values, descending):
+    """Rows strictly after ``values`` in (columns) order.
+    
+    Written as ``a <= x AND (a < x OR <rest>)`` rather than a row-value
+    comparison so every database can use the leading column's index.
+    """
+    column, value = columns[0], values[0]
+    strict = column < value if descending else column > value
+    if len(columns) == 1:
+        return strict
+    loose = column <= value if descending else column >= value
+    return loose & (strict | _beyond(columns[1:], values[1:], descending))
+
+def keyset_paginate(query, columns, per_page, cursor=None, descending=False, total=None):
+    """Return a ``KeysetPage`` of ``query`` ordered by ``columns``.
+    
+    ``columns`` must be unique together (end with the primary key) and
+    be attributes of the queried entity. ``cursor`` is a value from a
+    previous page's ``next_cursor`` or ``prev_cursor``; raises ValueError
+    if it is malformed.
+    """
+    return keyset_paginate_partitions([(query, columns)], per_page, cursor, descending, total)
+
+def keyset_paginate_partitions(partitions, per_page, cursor=None, descending=False, total=None):
+    """Return a ``KeysetPage`` over several ``(query, columns)`` partitions.
+    
+    Every key of a partition must sort above every key of the ones after
+    it, and the columns of each must have the same names. A page that
+    runs past the end of one partition continues into the next.
+    """
+    values = None
+    backwards = False
+    if cursor:
+        values, backwards = decode_cursor(cursor)
+    
+    # Walking backwards is walking forwards in the opposite order
+    reverse = descending != backwards
+    
+    rows = []
+    for query, columns in (partitions if reverse else partitions[::-1]):
+        if values is not None:
+            if len(values) != len(columns):
+                raise ValueError(f'Invalid cursor: {cursor}')
+            query = query.filter(_beyond(columns, values, reverse))
+        
+        query = query.order_by(*[column.desc() if reverse else column.asc() for column in columns])
+        
+        # One extra row tells whether there is another page in this direction
+        rows += query.limit(per_page + 1 - len(rows)).all()
+        if len(rows) > per_page:
+            break
+    
+    columns = partitions[0][1]
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+    
+    def key(row):
+        return [getattr(row, column.key) for column in columns]
+    
+    next_cursor = prev_cursor = None
+    if rows:
+        if more or backwards:
+            next_cursor = encode_cursor(key(rows[-1]))
+        if (more and backwards) or (cursor and not backwards):
+            prev_cursor = encode_cursor(key(rows[0]), backwards=True)
+    
+    return KeysetPage(rows, next_cursor, prev_cursor, total)
+
+def cached_count(key, query):
+    """Return ``query``'s row count, cached for COUNT_CACHE_TTL seconds."""
+    count = _counts.get(key)
+    if count is None:
+        count = query.enable_eagerloads(False).order_by(None).count()
+        _counts.set(key, count)
+    return count
@@ -0,0 +1,155 @@
+"""Report builders run as background jobs.
+
+Each builder takes the job and its params, writes a file under
+``static/uploads/reports`` and returns its path.
+"""
+import pandas as pd
+from datetime import datetime
+from app import db
+from models import Product, DailyMovement
+from services.jobs import job_handler
+from utils import generate_inventory_pdf, export_to_excel, generate_monthly_pdf, export_monthly_excel
+
+def month_range(year, month):
+    """Return the [start, end) datetimes of a month; raises ValueError."""
+    start_date = datetime(int(year), int(month), 1)
+    if int(month) == 12:
+        end_date = datetime(int(year) + 1, 1, 1)
+    else:
+        end_date = datetime(int(year), int(month) + 1, 1)
+    return start_date, end_date
+
+def monthly_movements(start_date, end_date):
+    """Return per-product movement totals for [start_date, end_date).
+    
+    A single joined ``GROUP BY`` over the daily rollup with conditional
+    sums per action type; both bounds must fall on midnight. Returns a
+    DataFrame indexed by product id with the columns sku, name, category,
+    stock_in, stock_out, adjustments and net_change.
+    """
+    def action_sum(action_type):
+        return db.func.coalesce(db.func.sum(
+            db.case((DailyMovement.action_type == action_type, DailyMovement.quantity), else_=0)
+        ), 0)
+    
+    rows = db.session.query(
+        Product.id,
+        Product.sku,
+        Product.name,
+        Product.category,
+        action_sum('in'),
+        action_sum('out'),
+        action_sum('adjust')
+    ).join(
+        DailyMovement, DailyMovement.product_id == Product.id
+    ).filter(
+        DailyMovement.day >= start_date.date(),
+        DailyMovement.day < end_date.date()
+    ).group_by(
+        Product.id, Product.sku, Product.name, Product.category
+    ).order_by(Product.name).all()
+    
+    df = pd.DataFrame(
+        rows,
+        columns=['product_id', 'sku', 'name', 'category', 'stock_in', 'stock_out', 'adjustments']
+    ).set_index('product_id')
+    df['net_change'] = df['stock_in'] - df['stock_out'] + df['adjustments']
+    
+    return df
+
+def movement_trend(months=12):
+    """Return stock in/out totals for each of the last ``months`` months.
+    
+    Reads one summed row per day from the rollup. Returns a dict of
+    parallel lists: labels ('Oct 2026'), stock_in and stock_out.
+    """
+    # Months numbered year * 12 + month - 1, so ranges carry over into years;
+    # rollup days are UTC dates
+    today = datetime.utcnow()
+    first_month = today.year * 12 + today.month - months
+    start_date = datetime(first_month // 12, first_month % 12 + 1, 1)
+    
+    def action_sum(action_type):
+        return db.func.coalesce(db.func.sum(
+            db.case((DailyMovement.action_type == action_type, DailyMovement.quantity), else_=0)
+        ), 0)
+    
+    rows = db.session.query(
+        DailyMovement.day,
+        action_sum('in'),
+        action_sum('out')
+    ).filter(
+        DailyMovement.day >= start_date.date(),
+        DailyMovement.action_type.in_(['in', 'out'])
+    ).group_by(DailyMovement.day).all()
+    
+    totals = {}
+    for month in range(first_month, first_month + months):
+        totals[(month // 12, month % 12 + 1)] = [0, 0]
+    for day, stock_in, stock_out in rows:
+        if (day.year, day.month) in totals:
+            totals[(day.year, day.month)][0] += stock_in
+            totals[(day.year, day.month)][1] += stock_out
+    
+    return {
+        'labels': [datetime(year, month, 1).strftime('%b %Y') for year, month in totals],
+        'stock_in': [stock_in for stock_in, _ in totals.values()],
+        'stock_out': [stock_out for _, stock_out in totals.values()]
+    }
+
+def get_category_stats():
+    """Return product count, quantity and value per category.
+    
+    One ``GROUP BY`` query; products without a category are left out.
+    Returns a dict keyed by category, ordered by category name.
+    """
+    rows = db.session.query(
+        Product.category,
+        db.func.count(Product.id),
+        db.func.coalesce(db.func.sum(Product.quantity), 0),
+        db.func.coalesce(db.func.sum(Product.price_sell * Product.quantity), 0)
+    ).filter(
+        Product.category.isnot(None),
+        Product.category != ''
+    ).group_by(Product.category).order_by(Product.category).all()
+    
+    return {
+        category: {'count': count, 'quantity': quantity, 'value': value}
+        for category, count, quantity, value in rows
+    }
+
+def _stamp(job):
+    # The id keeps jobs created in the same second from sharing a file
+    return f"{job.created_at.strftime('%Y%m%d_%H%M%S')}_{job.id}"
+
+@job_handler('inventory_report')
+def build_inventory_report(job, params):
+    query = Product.query
+    
+    if params.get('category'):
+        query = query.filter_by(category=params['category'])
+    
+    query = query.order_by(Product.name)
+    
+    if params['report_type'] == 'pdf':
+        return generate_inventory_pdf(query.all(), f"inventory_report_{_stamp(job)}.pdf")
+    return export_to_excel(query, f"inventory_report_{_stamp(job)}.xlsx")
+
+@job_handler('low_stock_report')
+def build_low_stock_report(job, params):
+    query = Product.query.filter(
+        Product.quantity <= params['threshold']
+    ).order_by(Product.quantity)
+    
+    if params['report_type'] == 'pdf':
+        return generate_inventory_pdf(query.all(), f"low_stock_report_{_stamp(job)}.pdf")
+    return export_to_excel(query, f"low_stock_report_{_stamp(job)}.xlsx")
+
+@job_handler('monthly_report')
+def build_monthly_report(job, params):
+    year, month = params['year'], params['month']
+    movements = monthly_movements(*month_range(year, month))
+    
+    if params['report_type'] == 'pdf':
+        return generate_monthly_pdf(movements, year, month, f"monthly_report_{year}_{month}_{_stamp(job)}.pdf")
+    return export_monthly_excel(movements, f"monthly_report_{year}_{month}_{_stamp(job)}.xlsx")
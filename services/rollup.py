@@ -0,0 +1,117 @@
+"""Daily movement rollup.
+
+``daily_movement`` holds one row per (day, product, action type) with the
+summed quantity and the number of log rows. Stock movements add to it in
+the same transaction as their ``InventoryLog`` rows, so dashboards and
+reports can read days instead of scanning the ledger: a month costs at
+most days x active products rows however busy the scanners were.
+
+Days are the UTC dates of ``InventoryLog.created_at``. If the ledger is
+written some other way, ``rebuild_daily_movements`` (or
+``rebuild_daily_movements.py``) recomputes the rollup from it, archived
+rows included.
+"""
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import insert, delete, select, union_all
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from app import db
+from models import InventoryLog, ArchivedInventoryLog, DailyMovement
+
+# Dialects whose INSERT supports ON CONFLICT DO UPDATE
+_ON_CONFLICT = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+_KEY = ['day', 'product_id', 'action_type']
+
+def _day(column):
+    """SQL expression for the date part of a DateTime column."""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        # CAST(... AS DATE) is numeric on SQLite; date() gives the stored 'YYYY-MM-DD'
+        return db.func.date(column)
+    return db.cast(column, db.Date)
+
+def add_movements(log_rows):
+    """Add logged movements to the rollup without committing.
+    
+    ``log_rows`` are dicts with ``product_id``, ``action_type``,
+    ``quantity`` and ``created_at``, as inserted into ``InventoryLog``.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for row in log_rows:
+        key = (row['created_at'].date(), row['product_id'], row['action_type'])
+        totals[key][0] += row['quantity']
+        totals[key][1] += 1
+    
+    if not totals:
+        return
+    
+    values = [
+        {'day': day, 'product_id': product_id, 'action_type': action_type,
+         'quantity': quantity, 'movements': movements}
+        for (day, product_id, action_type), (quantity, movements) in totals.items()
+    ]
+    dialect = db.session.get_bind().dialect.name
+    
+    if dialect == 'mysql':
+        stmt = mysql.insert(DailyMovement).values(values)
+        stmt = stmt.on_duplicate_key_update(
+            quantity=DailyMovement.quantity + stmt.inserted.quantity,
+            movements=DailyMovement.movements + stmt.inserted.movements
+        )
+        db.session.execute(stmt)
+    elif dialect in _ON_CONFLICT:
+        stmt = _ON_CONFLICT[dialect](DailyMovement).values(values)
+        stmt = stmt.on_conflict_do_update(index_elements=_KEY, set_={
+            'quantity': DailyMovement.quantity + stmt.excluded.quantity,
+            'movements': DailyMovement.movements + stmt.excluded.movements
+        })
+        db.session.execute(stmt)
+    else:
+        for value in values:
+            updated = DailyMovement.query.filter_by(
+                day=value['day'], product_id=value['product_id'], action_type=value['action_type']
+            ).update({
+                'quantity': DailyMovement.quantity + value['quantity'],
+                'movements': DailyMovement.movements + value['movements']
+            }, synchronize_session=False)
+            if not updated:
+                db.session.execute(insert(DailyMovement), [value])
+
+def rebuild_daily_movements(since=None):
+    """Recompute the rollup from the ledger and commit.
+    
+    With ``since`` (a date) only that day and later are rebuilt. Returns
+    the number of rollup rows written.
+    """
+    parts = []
+    for model in (InventoryLog, ArchivedInventoryLog):
+        part = select(model.created_at, model.product_id, model.action_type, model.quantity)
+        if since is not None:
+            part = part.where(model.created_at >= datetime.combine(since, datetime.min.time()))
+        parts.append(part)
+    logs = union_all(*parts).subquery()
+    
+    day = _day(logs.c.created_at)
+    source = select(
+        day,
+        logs.c.product_id,
+        logs.c.action_type,
+        db.func.sum(logs.c.quantity),
+        db.func.count()
+    ).group_by(day, logs.c.product_id, logs.c.action_type)
+    
+    clear = delete(DailyMovement)
+    if since is not None:
+        clear = clear.where(DailyMovement.day >= since)
+    
+    try:
+        db.session.execute(clear)
+        result = db.session.execute(insert(DailyMovement).from_select(
+            _KEY + ['quantity', 'movements'], source
+        ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    return result.rowcount
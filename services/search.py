@@ -0,0 +1,204 @@
+"""Full-text product search.
+
+On SQLite the ``product_fts`` FTS5 table holds one row per product (rowid
+is the product id) with its name, SKU, barcode, category, color and all
+custom attribute values. Triggers on ``product`` and ``product_attribute``
+keep it in sync, so bulk imports and raw SQL writes are covered too.
+
+On MySQL the same columns carry FULLTEXT indexes, which InnoDB maintains
+itself. Note that InnoDB ignores words shorter than
+``innodb_ft_min_token_size`` (3 by default).
+
+Every word of a search term must match the start of a word in one of the
+indexed columns, and results are ranked by relevance. Databases without
+either feature fall back to the old ``ilike`` substring search.
+"""
+import re
+import logging
+from sqlalchemy import inspect
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects.mysql import match
+from app import db
+from models import Product, ProductAttribute
+
+logger = logging.getLogger(__name__)
+
+# bm25 weights for name, sku, barcode, category, color, attributes
+FTS_WEIGHTS = '10.0, 10.0, 10.0, 2.0, 2.0, 1.0'
+
+# Document for one product: its own columns plus every attribute value
+_FTS_ROW = """
+    SELECT p.id, p.name, p.sku, p.barcode, p.category, p.color,
+           (SELECT group_concat(value, ' ') FROM product_attribute WHERE product_id = p.id)
+    FROM product p WHERE p.id = {product_id}
+"""
+
+def _refresh(product_id):
+    return (
+        f"DELETE FROM product_fts WHERE rowid = {product_id};"
+        f"INSERT INTO product_fts (rowid, name, sku, barcode, category, color, attributes)"
+        f"{_FTS_ROW.format(product_id=product_id)};"
+    )
+
+SQLITE_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+        name, sku, barcode, category, color, attributes, prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_insert AFTER INSERT ON product BEGIN
+        -- A new product has no attributes yet; their own trigger adds them
+        INSERT INTO product_fts (rowid, name, sku, barcode, category, color)
+        VALUES (new.id, new.name, new.sku, new.barcode, new.category, new.color);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_fts_update
+    AFTER UPDATE OF name, sku, barcode, category, color ON product
+    WHEN old.name IS NOT new.name OR old.sku IS NOT new.sku OR old.barcode IS NOT new.barcode
+      OR old.category IS NOT new.category OR old.color IS NOT new.color BEGIN
+        {_refresh('new.id')}
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_delete AFTER DELETE ON product BEGIN
+        DELETE FROM product_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_attribute_insert AFTER INSERT ON product_attribute
+    WHEN new.value IS NOT NULL BEGIN
+        UPDATE product_fts SET attributes = coalesce(attributes || ' ', '') || new.value
+        WHERE rowid = new.product_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_fts_attribute_update
+    AFTER UPDATE OF product_id, value ON product_attribute
+    WHEN old.product_id IS NOT new.product_id OR old.value IS NOT new.value BEGIN
+        {_refresh('new.product_id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_fts_attribute_move
+    AFTER UPDATE OF product_id ON product_attribute
+    WHEN old.product_id IS NOT new.product_id BEGIN
+        {_refresh('old.product_id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_fts_attribute_delete AFTER DELETE ON product_attribute BEGIN
+        {_refresh('old.product_id')}
+    END
+    """
+]
+
+MYSQL_INDEXES = {
+    'ix_product_search': ('product', 'name, sku, barcode, category, color'),
+    'ix_product_attribute_search': ('product_attribute', 'value')
+}
+
+_backend = None
+
+def search_backend():
+    """Return 'fts5', 'mysql' or None for the database in use."""
+    global _backend
+    if _backend is None:
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite' and inspect(db.engine).has_table('product_fts'):
+            _backend = 'fts5'
+        elif dialect == 'mysql':
+            _backend = 'mysql'
+        else:
+            _backend = ''
+    return _backend or None
+
+def create_search_index():
+    """Create the search table, triggers or indexes for this database."""
+    global _backend
+    _backend = None
+    dialect = db.engine.dialect.name
+    
+    if dialect == 'sqlite':
+        try:
+            with db.engine.begin() as connection:
+                for statement in SQLITE_SCHEMA:
+                    connection.exec_driver_sql(statement)
+        except OperationalError as e:
+            # SQLite built without FTS5; search keeps using LIKE
+            logger.warning(f"Full-text search unavailable: {e}")
+    
+    elif dialect == 'mysql':
+        existing = {
+            index['name']
+            for table in ('product', 'product_attribute')
+            for index in inspect(db.engine).get_indexes(table)
+        }
+        with db.engine.begin() as connection:
+            for name, (table, columns) in MYSQL_INDEXES.items():
+                if name not in existing:
+                    connection.exec_driver_sql(f'CREATE FULLTEXT INDEX {name} ON {table} ({columns})')
+
+def rebuild_search_index():
+    """Rebuild the search index from scratch; returns the number of products."""
+    create_search_index()
+    backend = search_backend()
+    
+    with db.engine.begin() as connection:
+        if backend == 'fts5':
+            connection.exec_driver_sql('DELETE FROM product_fts')
+            connection.exec_driver_sql("""
+                INSERT INTO product_fts (rowid, name, sku, barcode, category, color, attributes)
+                SELECT p.id, p.name, p.sku, p.barcode, p.category, p.color, a.attributes
+                FROM product p
+                LEFT JOIN (
+                    SELECT product_id, group_concat(value, ' ') AS attributes
+                    FROM product_attribute GROUP BY product_id
+                ) a ON a.product_id = p.id
+            """)
+            connection.exec_driver_sql("INSERT INTO product_fts (product_fts) VALUES ('optimize')")
+        elif backend == 'mysql':
+            connection.exec_driver_sql('OPTIMIZE TABLE product, product_attribute')
+    
+    return db.session.query(db.func.count(Product.id)).scalar()
+
+def _words(term):
+    return re.findall(r'\w+', term)
+
+def search_products(query, term):
+    """Filter a Product query by a search term, best matches first."""
+    words = _words(term)
+    backend = search_backend()
+    
+    if not words or backend is None:
+        return query.filter(
+            Product.name.ilike(f'%{term}%') |
+            Product.sku.ilike(f'%{term}%') |
+            Product.barcode.ilike(f'%{term}%')
+        ).order_by(Product.name)
+    
+    if backend == 'fts5':
+        # Each word is quoted, so user input cannot inject FTS5 syntax
+        matches = db.text(
+            f"SELECT rowid AS product_id, bm25(product_fts, {FTS_WEIGHTS}) AS rank "
+            f"FROM product_fts WHERE product_fts MATCH :terms"
+        ).bindparams(
+            terms=' '.join(f'"{word}"*' for word in words)
+        ).columns(product_id=db.Integer, rank=db.Float).subquery('search')
+        
+        # bm25 scores are negative; lower is a better match
+        return query.join(matches, matches.c.product_id == Product.id).order_by(matches.c.rank, Product.name)
+    
+    terms = ' '.join(f'+{word}*' for word in words)
+    product_match = match(
+        Product.name, Product.sku, Product.barcode, Product.category, Product.color,
+        against=terms
+    ).in_boolean_mode()
+    attribute_match = db.session.query(ProductAttribute.product_id).filter(
+        match(ProductAttribute.value, against=terms).in_boolean_mode()
+    )
+    
+    return query.filter(
+        product_match | Product.id.in_(attribute_match)
+    ).order_by(product_match.desc(), Product.name)
@@ -0,0 +1,141 @@
+"""Typed, in-memory system settings.
+
+All ``Setting`` rows are loaded once per process and reads are served
+from memory. Every change also bumps the ``_version`` row; each process
+compares that row with the version it loaded at most once every
+SETTINGS_CHECK_INTERVAL seconds and reloads when it differs. A change
+made in this process is visible immediately, one made by another
+gunicorn worker within that interval.
+
+Settings are declared in ``DEFINITIONS`` with their type and default;
+stored values that fail to parse fall back to the default.
+"""
+import time
+import logging
+import threading
+from collections import namedtuple
+from sqlalchemy.exc import SQLAlchemyError
+from flask import current_app
+from app import db
+from config import Config
+from models import Setting
+
+logger = logging.getLogger(__name__)
+
+Definition = namedtuple('Definition', ['type', 'default', 'choices', 'minimum', 'maximum'],
+                        defaults=[None, None, None])
+
+DEFINITIONS = {
+    'barcode_type': Definition(str, 'code128', choices=('code128', 'ean13', 'upc')),
+    'low_stock_threshold': Definition(int, 10, minimum=0),
+    'products_per_page': Definition(int, Config.PER_PAGE, minimum=1, maximum=200),
+    'history_per_page': Definition(int, 20, minimum=1, maximum=200)
+}
+
+# Key of the row bumped on every change
+VERSION_KEY = '_version'
+
+_lock = threading.Lock()
+_values = None
+_version = None
+_checked_at = 0.0
+
+def parse_setting(key, value):
+    """Convert a raw value to the setting's type; raises ValueError."""
+    definition = DEFINITIONS[key]
+    value = definition.type(value)
+    
+    if definition.choices and value not in definition.choices:
+        raise ValueError(f'{key} must be one of {", ".join(definition.choices)}')
+    if definition.minimum is not None and value < definition.minimum:
+        raise ValueError(f'{key} must be at least {definition.minimum}')
+    if definition.maximum is not None and value > definition.maximum:
+        raise ValueError(f'{key} must be at most {definition.maximum}')
+    
+    return value
+
+def _load():
+    """Read every row and return ``(values, version)``."""
+    values = {key: definition.default for key, definition in DEFINITIONS.items()}
+    version = None
+    
+    for setting in Setting.query.all():
+        if setting.key == VERSION_KEY:
+            version = setting.value
+        elif setting.key in DEFINITIONS:
+            try:
+                values[setting.key] = parse_setting(setting.key, setting.value)
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Ignoring stored setting {setting.key}={setting.value!r}: {e}")
+        else:
+            values[setting.key] = setting.value
+    
+    return values, version
+
+def reload_settings():
+    """Reload all settings from the database."""
+    global _values, _version, _checked_at
+    with _lock:
+        _values, _version = _load()
+        _checked_at = time.monotonic()
+
+def get_settings():
+    """Return the dict of all settings; do not modify it."""
+    global _checked_at
+    if _values is not None and time.monotonic() - _checked_at < current_app.config['SETTINGS_CHECK_INTERVAL']:
+        return _values
+    
+    try:
+        if _values is None:
+            reload_settings()
+        else:
+            version = db.session.query(Setting.value).filter_by(key=VERSION_KEY).scalar()
+            if version != _version:
+                reload_settings()
+            else:
+                _checked_at = time.monotonic()
+    except SQLAlchemyError as e:
+        # Keep serving what we have (or the defaults) while the database is unavailable
+        logger.error(f"Could not load settings: {e}")
+        db.session.rollback()
+        if _values is None:
+            return {key: definition.default for key, definition in DEFINITIONS.items()}
+    
+    return _values
+
+def get_setting(key, default=None):
+    """Get a setting value; declared settings come back typed."""
+    return get_settings().get(key, default)
+
+def update_settings(values):
+    """Store several settings at once and bump the version.
+    
+    Declared settings are validated first; raises ValueError without
+    saving anything if one is invalid.
+    """
+    parsed = {
+        key: parse_setting(key, value) if key in DEFINITIONS else value
+        for key, value in values.items()
+    }
+    
+    existing = {setting.key: setting for setting in Setting.query.filter(Setting.key.in_(list(parsed)))}
+    for key, value in parsed.items():
+        if key in existing:
+            existing[key].value = str(value)
+        else:
+            db.session.add(Setting(key=key, value=str(value)))
+    
+    # Other processes notice the new version and reload
+    bumped = Setting.query.filter_by(key=VERSION_KEY).update(
+        {'value': db.cast(db.cast(Setting.value, db.Integer) + 1, db.String)},
+        synchronize_session=False
+    )
+    if not bumped:
+        db.session.add(Setting(key=VERSION_KEY, value='1'))
+    
+    db.session.commit()
+    reload_settings()
+
+def update_setting(key, value):
+    """Update or create a single setting."""
+    update_settings({key: value})
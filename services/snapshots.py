@@ -0,0 +1,164 @@
+"""Stock snapshots and point-in-time quantities.
+
+``adjust`` log rows store a delta and imports or the add form set
+quantities without a log row, so the ledger alone cannot say what was on
+hand at a given time. A ``StockSnapshot`` anchors it: a product's
+quantity together with the id of the last log row it includes. Log ids
+of one product follow commit order, because every movement updates the
+product row (and so waits for its lock) before inserting its log row.
+
+Snapshots are taken for every product whose stock changed since its last
+one (``take_stock_snapshots.py``, meant to run nightly), and for the products an
+import or the add form writes. ``quantity_as_of`` then replays at most
+the log rows since the nearest snapshot, and ``check_consistency``
+verifies ``Product.quantity`` against the latest snapshot plus the rows
+after it. Archived rows keep their ids (see ``services/archive.py``), so
+both tables are read as one ledger.
+
+A routine snapshot skips products that fail that check, since a new
+baseline at a drifted quantity would hide the drift. Only the writes that
+set a quantity without a log row, and ``check_stock_ledger.py --fix``,
+accept the current quantity as it is.
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import insert, select
+from app import db
+from models import Product, InventoryLog, ArchivedInventoryLog, StockSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Live rows first; archived ids are all lower
+LEDGER = (InventoryLog, ArchivedInventoryLog)
+
+def _signed_quantity(model=InventoryLog):
+    """A log row's effect on the quantity on hand ('adjust' rows hold the delta)."""
+    return db.case((model.action_type == 'out', -model.quantity), else_=model.quantity)
+
+def _latest_snapshot_id():
+    """Correlated subquery for the id of each product's latest snapshot."""
+    return select(StockSnapshot.id).where(
+        StockSnapshot.product_id == Product.id
+    ).order_by(
+        StockSnapshot.taken_at.desc(), StockSnapshot.id.desc()
+    ).limit(1).correlate(Product).scalar_subquery()
+
+def _last_log_id():
+    """Correlated subquery for each product's highest log id, or 0."""
+    return db.func.coalesce(*[
+        select(db.func.max(model.id)).where(model.product_id == Product.id).correlate(Product).scalar_subquery()
+        for model in LEDGER
+    ], 0)
+
+def take_snapshots(product_ids=None, changed_only=True, verify=True):
+    """Snapshot products in one ``INSERT ... SELECT`` and commit.
+    
+    Without ``product_ids`` every product is considered. With
+    ``changed_only`` products whose latest snapshot still matches their
+    quantity and last log row are skipped. With ``verify`` products that
+    ``check_consistency`` reports are skipped and logged as warnings; pass
+    False to accept quantities that were set without a log row. Returns
+    the number taken.
+    """
+    last_log_id = _last_log_id()
+    quantity = db.func.coalesce(Product.quantity, 0)
+    
+    source = select(Product.id, last_log_id, quantity, db.literal(datetime.utcnow()))
+    if product_ids is not None:
+        source = source.where(Product.id.in_(list(product_ids)))
+    if changed_only:
+        source = source.where(~select(StockSnapshot.id).where(
+            StockSnapshot.id == _latest_snapshot_id(),
+            StockSnapshot.log_id == last_log_id,
+            StockSnapshot.quantity == quantity
+        ).correlate(Product).exists())
+    if verify:
+        mismatches = check_consistency(product_ids)
+        for row in mismatches:
+            logger.warning(f"Not snapshotting {row['sku']}: quantity {row['quantity']}, "
+                           f"snapshot and ledger say {row['expected']}")
+        if mismatches:
+            source = source.where(Product.id.notin_([row['product_id'] for row in mismatches]))
+    
+    try:
+        result = db.session.execute(insert(StockSnapshot).from_select(
+            ['product_id', 'log_id', 'quantity', 'taken_at'], source
+        ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    return result.rowcount
+
+def _log_total(product_id, criteria):
+    """Sum a product's log rows in both tables; ``criteria(model)`` returns the filters."""
+    return sum(
+        db.session.query(db.func.coalesce(db.func.sum(_signed_quantity(model)), 0)).filter(
+            model.product_id == product_id, *criteria(model)
+        ).scalar()
+        for model in LEDGER
+    )
+
+def quantity_as_of(product_id, when):
+    """Return a product's quantity on hand at ``when`` (UTC), or None if unknown.
+    
+    Replays the log rows after the latest snapshot taken by then. Before
+    the first snapshot it works backwards from the next one instead, or
+    from the current quantity if there is none.
+    """
+    product = db.session.query(Product.quantity, Product.created_at).filter(Product.id == product_id).first()
+    if product is None:
+        return None
+    if product.created_at and when < product.created_at:
+        return 0
+    
+    snapshots = StockSnapshot.query.filter(StockSnapshot.product_id == product_id)
+    before = snapshots.filter(StockSnapshot.taken_at <= when).order_by(
+        StockSnapshot.taken_at.desc(), StockSnapshot.id.desc()
+    ).first()
+    if before is not None:
+        return before.quantity + _log_total(
+            product_id, lambda log: (log.id > before.log_id, log.created_at <= when)
+        )
+    
+    after = snapshots.filter(StockSnapshot.taken_at > when).order_by(
+        StockSnapshot.taken_at, StockSnapshot.id
+    ).first()
+    if after is not None:
+        return after.quantity - _log_total(
+            product_id, lambda log: (log.id <= after.log_id, log.created_at > when)
+        )
+    
+    return (product.quantity or 0) - _log_total(product_id, lambda log: (log.created_at > when,))
+
+def check_consistency(product_ids=None):
+    """Compare each product's quantity with its latest snapshot plus later log rows.
+    
+    Returns a list of dicts (product_id, sku, name, quantity, expected)
+    for the products that disagree; products without a snapshot are
+    compared with the whole ledger.
+    """
+    tails = [
+        select(db.func.coalesce(db.func.sum(_signed_quantity(model)), 0)).where(
+            model.product_id == Product.id,
+            model.id > db.func.coalesce(StockSnapshot.log_id, 0)
+        ).correlate(Product, StockSnapshot).scalar_subquery()
+        for model in LEDGER
+    ]
+    expected = db.func.coalesce(StockSnapshot.quantity, 0) + tails[0] + tails[1]
+    
+    query = db.session.query(
+        Product.id, Product.sku, Product.name, Product.quantity, expected
+    ).outerjoin(
+        StockSnapshot, StockSnapshot.id == _latest_snapshot_id()
+    ).filter(
+        db.func.coalesce(Product.quantity, 0) != expected
+    )
+    if product_ids is not None:
+        query = query.filter(Product.id.in_(list(product_ids)))
+    
+    return [
+        {'product_id': product_id, 'sku': sku, 'name': name, 'quantity': quantity or 0, 'expected': value}
+        for product_id, sku, name, quantity, value in query.order_by(Product.id)
+    ]
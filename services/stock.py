@@ -0,0 +1,209 @@
+"""Stock movement service.
+
+All changes to ``Product.quantity`` go through this module so that the
+quantity update, its ``InventoryLog`` row and the daily rollup (see
+``services/rollup.py``) are written in the same transaction, and so that
+concurrent scanners never lose an update.
+"""
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+from app import db
+from models import Product, InventoryLog, ScanBatch
+from services.kpi import invalidate_kpis
+from services.barcodes import forget_products
+from services.rollup import add_movements
+
+class StockError(Exception):
+    """Base class for stock movement failures."""
+
+class ProductNotFound(StockError):
+    """Raised when the target product does not exist."""
+    
+    def __init__(self, product_id):
+        super().__init__(f'Product {product_id} not found')
+        self.product_id = product_id
+
+class DuplicateBatch(StockError):
+    """Raised when a batch with the same key was already applied."""
+    
+    def __init__(self, key):
+        super().__init__(f'Batch {key} was already applied')
+        self.key = key
+
+class InsufficientStock(StockError):
+    """Raised when a stock-out would take the quantity below zero."""
+    
+    def __init__(self, product_id, available):
+        super().__init__(f'Not enough inventory. Current quantity: {available}')
+        self.product_id = product_id
+        self.available = available
+
+def _update_product(product_id, *criteria, **values):
+    """Run an UPDATE on one product row and return the affected row count."""
+    stmt = update(Product).where(Product.id == product_id, *criteria).values(**values)
+    result = db.session.execute(stmt.execution_options(synchronize_session=False))
+    return result.rowcount
+
+def _lock_product_row(product_id):
+    """Take a write lock on a product row and return its current quantity.
+    
+    MySQL and PostgreSQL use ``SELECT ... FOR UPDATE``. SQLite has no row
+    locks, so a no-op ``UPDATE`` is issued instead; it takes the database
+    write lock, which serializes every other writer until we commit.
+    """
+    query = db.session.query(Product.quantity).filter(Product.id == product_id)
+    
+    if db.session.get_bind().dialect.name == 'sqlite':
+        if not _update_product(product_id, quantity=Product.quantity):
+            raise ProductNotFound(product_id)
+        return query.scalar() or 0
+    
+    row = query.with_for_update().first()
+    if row is None:
+        raise ProductNotFound(product_id)
+    return row.quantity or 0
+
+def apply_stock_change(product_id, action_type, quantity):
+    """Apply one movement to the product row without committing.
+    
+    ``quantity`` is the number of units moved for 'in' and 'out', and the
+    new absolute count for 'adjust'. Returns the quantity to record in the
+    log: the units moved for 'in'/'out', the signed delta for 'adjust'.
+    """
+    current = db.func.coalesce(Product.quantity, 0)
+    
+    if action_type == 'in':
+        if not _update_product(product_id, quantity=current + quantity):
+            raise ProductNotFound(product_id)
+        return quantity
+    
+    if action_type == 'out':
+        if not _update_product(product_id, current >= quantity, quantity=current - quantity):
+            available = db.session.query(Product.quantity).filter(Product.id == product_id).first()
+            if available is None:
+                raise ProductNotFound(product_id)
+            raise InsufficientStock(product_id, available.quantity or 0)
+        return quantity
+    
+    if action_type == 'adjust':
+        previous = _lock_product_row(product_id)
+        _update_product(product_id, quantity=quantity)
+        return quantity - previous
+    
+    raise ValueError(f'Unknown action type: {action_type}')
+
+def record_movement(product_id, action_type, quantity, reason, user_id):
+    """Apply a stock movement and log it in a single transaction.
+    
+    Rolls back and re-raises on failure. Returns the committed
+    ``InventoryLog``.
+    """
+    try:
+        logged_quantity = apply_stock_change(product_id, action_type, quantity)
+        log = InventoryLog(
+            product_id=product_id,
+            action_type=action_type,
+            quantity=logged_quantity,
+            reason=reason,
+            created_by=user_id,
+            created_at=datetime.utcnow()
+        )
+        db.session.add(log)
+        add_movements([{
+            'product_id': product_id,
+            'action_type': action_type,
+            'quantity': logged_quantity,
+            'created_at': log.created_at
+        }])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    invalidate_kpis()
+    forget_products([product_id])
+    
+    return log
+
+def record_batch(lines, user_id, batch_key=None):
+    """Apply a batch of scanned movements in one transaction.
+    
+    Each line is a dict with ``barcode`` or ``product_id``, ``qty``,
+    ``action`` ('in', 'out' or 'adjust') and ``reason``. Barcodes are
+    resolved with a single ``IN`` query and the log rows are written with
+    one bulk insert. A failing line does not abort the batch; every line
+    gets an entry in the returned results list, in input order.
+    
+    A ``batch_key`` is recorded in the same transaction; a batch resent
+    with a key that is already recorded raises ``DuplicateBatch`` and
+    changes nothing.
+    """
+    barcodes = {str(line['barcode']) for line in lines if line.get('barcode') and not line.get('product_id')}
+    barcode_map = {}
+    if barcodes:
+        barcode_map = dict(
+            db.session.query(Product.barcode, Product.id).filter(Product.barcode.in_(barcodes)).all()
+        )
+    
+    results = []
+    log_rows = []
+    
+    try:
+        if batch_key:
+            # Claim the key first, so a concurrent resend waits for or fails on it
+            try:
+                db.session.execute(insert(ScanBatch).values(
+                    key=batch_key, created_by=user_id, created_at=datetime.utcnow()
+                ))
+            except IntegrityError:
+                raise DuplicateBatch(batch_key)
+        
+        for index, line in enumerate(lines):
+            product_id = line.get('product_id') or barcode_map.get(str(line.get('barcode')))
+            result = {'line': index, 'product_id': product_id, 'success': False}
+            results.append(result)
+            
+            if not product_id:
+                result['message'] = 'Product not found'
+                continue
+            
+            try:
+                logged_quantity = apply_stock_change(product_id, line['action'], line['qty'])
+            except (StockError, ValueError) as e:
+                result['message'] = str(e)
+                continue
+            
+            result['success'] = True
+            log_rows.append({
+                'product_id': product_id,
+                'action_type': line['action'],
+                'quantity': logged_quantity,
+                'reason': line.get('reason'),
+                'created_by': user_id,
+                'created_at': datetime.utcnow()
+            })
+        
+        if log_rows:
+            db.session.execute(insert(InventoryLog), log_rows)
+            add_movements(log_rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    if log_rows:
+        invalidate_kpis()
+    
+    # Report the committed quantities for every product the batch touched
+    touched = {r['product_id'] for r in results if r['success']}
+    if touched:
+        forget_products(touched)
+        quantities = dict(
+            db.session.query(Product.id, Product.quantity).filter(Product.id.in_(touched)).all()
+        )
+        for result in results:
+            if result['success']:
+                result['quantity'] = quantities.get(result['product_id'])
+    
+    return results
@@ -0,0 +1,42 @@
+"""Cached user loading for Flask-Login.
+
+``load_user`` runs on every authenticated request. The loaded ``User`` is
+kept detached in a per-process LRU cache and merged into each request's
+session with ``load=False``, which attaches a copy without a query, so a
+cache hit costs no database round trip. The copy is an ordinary
+persistent object: changes to ``current_user`` are still saved on commit.
+
+Deleting a user and changing a profile or password call ``forget_user``.
+Other gunicorn workers keep their copy for up to USER_CACHE_TTL seconds;
+set it to 0 to disable the cache.
+"""
+from app import db
+from config import Config
+from models import User
+from services.cache import TTLCache
+
+_cache = TTLCache(maxsize=Config.USER_CACHE_SIZE, ttl=Config.USER_CACHE_TTL)
+
+def load_user(user_id):
+    """Return the User for a session's user id, or None."""
+    user_id = int(user_id)
+    cached = _cache.get(user_id)
+    
+    if cached is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        # Detach it so later commits in this session cannot expire the cached copy
+        db.session.expunge(user)
+        _cache.set(user_id, user)
+        cached = user
+    
+    return db.session.merge(cached, load=False)
+
+def forget_user(user_id):
+    """Drop a cached user after it changed or was deleted."""
+    _cache.pop(int(user_id))
+
+def user_cache_stats():
+    """Return size and hit/miss counters of the user cache."""
+    return _cache.stats()
@@ -146,7 +146,7 @@ function displayProductInfo(product) {
     if (product.quantity <= 0) {
         stockStatusClass = 'bg-danger';
         stockStatusText = 'Out of Stock';
-    } else if (product.quantity < 10) {
+    } else if (product.quantity <= parseInt(resultContainer.dataset.lowStockThreshold, 10)) {
         stockStatusClass = 'bg-warning';
         stockStatusText = 'Low Stock';
     }
@@ -9,8 +9,29 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Initialize barcode scanner for inventory
     initInventoryBarcodeScan();
+    
+    // Initialize scan session mode
+    initScanSession();
+    
+    // Initialize on-demand product lookups
+    initProductTypeaheads();
 });
 
+/**
+ * Scan session state: scans are queued on the client and
+ * flushed to the batch endpoint in groups
+ */
+const scanSession = {
+    active: false,
+    action: null,
+    batchUrl: null,
+    batchSize: 50,
+    queue: [],
+    // Batch sent but not confirmed yet; resent under the same key until it is
+    inFlight: null,
+    flushing: false
+};
+
 /**
  * Initialize date picker elements
  */
@@ -40,7 +61,12 @@ function initInventoryBarcodeScan() {
         // Check if Enter key is pressed
         if (e.key === 'Enter') {
             e.preventDefault();
-            processInventoryBarcode(this.value);
+            if (scanSession.active) {
+                queueSessionScan(this.value);
+                this.value = '';
+            } else {
+                processInventoryBarcode(this.value);
+            }
         }
     });
     
@@ -211,3 +237,358 @@ function clearInventoryForm() {
         errorContainer.style.display = 'none';
     }
 }
+
+/**
+ * Initialize scan session mode for high-volume receiving and picking
+ */
+function initScanSession() {
+    const toggle = document.getElementById('scan-session-toggle');
+    const sessionContainer = document.getElementById('scan-session');
+    
+    if (!toggle || !sessionContainer) return;
+    
+    scanSession.action = toggle.dataset.action;
+    scanSession.batchUrl = sessionContainer.dataset.batchUrl;
+    
+    // Restore scans queued or in flight before a page reload
+    const saved = localStorage.getItem(scanSessionStorageKey());
+    if (saved) {
+        scanSession.queue = JSON.parse(saved);
+    }
+    const savedBatch = localStorage.getItem(`${scanSessionStorageKey()}-in-flight`);
+    if (savedBatch) {
+        scanSession.inFlight = JSON.parse(savedBatch);
+    }
+    
+    toggle.addEventListener('change', function() {
+        scanSession.active = this.checked;
+        sessionContainer.style.display = this.checked ? 'block' : 'none';
+        
+        if (this.checked) {
+            clearInventoryForm();
+        }
+        
+        const barcodeInput = document.getElementById('inventory-barcode-input');
+        if (barcodeInput) {
+            barcodeInput.focus();
+        }
+    });
+    
+    if (scanSession.queue.length > 0 || scanSession.inFlight) {
+        toggle.checked = true;
+        toggle.dispatchEvent(new Event('change'));
+    }
+    
+    const flushButton = document.getElementById('scan-session-flush');
+    if (flushButton) {
+        flushButton.addEventListener('click', function() {
+            flushScanSession(true);
+        });
+    }
+    
+    // Warn before leaving with scans that were not submitted
+    window.addEventListener('beforeunload', function(e) {
+        if (scanSession.queue.length > 0 || scanSession.inFlight) {
+            e.preventDefault();
+            e.returnValue = '';
+        }
+    });
+    
+    updateScanSessionCount();
+}
+
+/**
+ * Storage key for the queued scans of the current page's action
+ * @returns {string} The localStorage key
+ */
+function scanSessionStorageKey() {
+    return `scan-session-${scanSession.action}`;
+}
+
+/**
+ * Random key the batch endpoint uses to apply a batch only once
+ * @returns {string} 32 hex digits
+ */
+function newScanBatchKey() {
+    const bytes = crypto.getRandomValues(new Uint8Array(16));
+    return Array.from(bytes, byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+/**
+ * Queue a scanned barcode, merging repeat scans of the same product
+ * @param {string} barcode - The scanned barcode
+ */
+function queueSessionScan(barcode) {
+    if (!barcode || barcode.trim() === '') {
+        showInventoryError('Please scan or enter a barcode');
+        return;
+    }
+    
+    const reason = document.getElementById('session-reason').value;
+    if (!reason) {
+        showInventoryError('Select a reason before scanning');
+        return;
+    }
+    
+    barcode = barcode.trim();
+    
+    const existing = scanSession.queue.find(line => line.barcode === barcode && line.reason === reason);
+    if (existing) {
+        existing.qty += 1;
+    } else {
+        scanSession.queue.push({
+            barcode: barcode,
+            qty: 1,
+            action: scanSession.action,
+            reason: reason
+        });
+    }
+    
+    saveScanSession();
+    
+    if (scanSession.queue.length >= scanSession.batchSize) {
+        flushScanSession(false);
+    }
+}
+
+/**
+ * Persist the queue and the batch in flight, and refresh the counter
+ */
+function saveScanSession() {
+    const storageKey = scanSessionStorageKey();
+    
+    if (scanSession.queue.length > 0) {
+        localStorage.setItem(storageKey, JSON.stringify(scanSession.queue));
+    } else {
+        localStorage.removeItem(storageKey);
+    }
+    
+    if (scanSession.inFlight) {
+        localStorage.setItem(`${storageKey}-in-flight`, JSON.stringify(scanSession.inFlight));
+    } else {
+        localStorage.removeItem(`${storageKey}-in-flight`);
+    }
+    
+    updateScanSessionCount();
+}
+
+/**
+ * Update the queued scan counter
+ */
+function updateScanSessionCount() {
+    const counter = document.getElementById('scan-session-count');
+    if (counter) {
+        const lines = scanSession.queue.concat(scanSession.inFlight ? scanSession.inFlight.lines : []);
+        counter.textContent = lines.reduce((total, line) => total + line.qty, 0);
+    }
+}
+
+/**
+ * Submit queued scans to the batch endpoint
+ * @param {boolean} all - Keep flushing until the queue is empty
+ */
+function flushScanSession(all) {
+    if (scanSession.flushing) return;
+    
+    // A batch that may or may not have been applied goes first, under its key
+    if (!scanSession.inFlight) {
+        if (scanSession.queue.length === 0) return;
+        
+        // Take a batch off the queue and save it before sending, so a reload
+        // mid-request resends it under the same key rather than queueing it again.
+        // Scans arriving meanwhile queue behind it.
+        scanSession.inFlight = {
+            key: newScanBatchKey(),
+            lines: scanSession.queue.splice(0, scanSession.batchSize)
+        };
+        saveScanSession();
+    }
+    
+    scanSession.flushing = true;
+    const batch = scanSession.inFlight;
+    
+    fetch(scanSession.batchUrl, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ key: batch.key, lines: batch.lines }),
+        credentials: 'same-origin'
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`HTTP error! Status: ${response.status}`);
+        }
+        return response.json();
+    })
+    .then(data => {
+        scanSession.inFlight = null;
+        saveScanSession();
+        showScanSessionResults(batch.lines, data);
+    })
+    .catch(error => {
+        console.error('Error submitting scan session:', error);
+        // Keep the batch in flight: it may have been applied, and resending its key is safe
+        showInventoryError('Error submitting scans. They are still queued; please try again.');
+        all = false;
+    })
+    .finally(() => {
+        scanSession.flushing = false;
+        if (all && (scanSession.queue.length > 0 || scanSession.inFlight)) {
+            flushScanSession(true);
+        }
+    });
+}
+
+/**
+ * Show the outcome of a submitted batch
+ * @param {Array} lines - The submitted lines
+ * @param {Object} data - The batch endpoint response
+ */
+function showScanSessionResults(lines, data) {
+    const resultsContainer = document.getElementById('scan-session-results');
+    if (!resultsContainer) return;
+    
+    const failures = data.results.filter(result => !result.success);
+    
+    resultsContainer.innerHTML = '';
+    
+    const summary = document.createElement('div');
+    summary.className = `alert ${failures.length ? 'alert-warning' : 'alert-success'} mb-2`;
+    // A resent batch the server had already applied
+    summary.textContent = data.duplicate ? data.message : `Submitted ${data.applied} of ${data.results.length} lines.`;
+    resultsContainer.appendChild(summary);
+    
+    if (failures.length) {
+        // Barcodes and messages are set as text so scanned input cannot inject markup
+        const list = document.createElement('ul');
+        list.className = 'list-group mb-2';
+        failures.forEach(result => {
+            const item = document.createElement('li');
+            item.className = 'list-group-item list-group-item-danger';
+            item.textContent = `${lines[result.line].barcode} \u00d7 ${lines[result.line].qty}: ${result.message}`;
+            list.appendChild(item);
+        });
+        resultsContainer.appendChild(list);
+    }
+}
+
+/**
+ * Turn every .product-typeahead block into a search box that loads
+ * matching products from the lookup API one page at a time
+ */
+function initProductTypeaheads() {
+    document.querySelectorAll('.product-typeahead').forEach(container => {
+        const hiddenInput = container.querySelector('input[type="hidden"]');
+        const searchInput = container.querySelector('input[type="search"]');
+        const resultsEl = container.querySelector('.typeahead-results');
+        const lookupUrl = container.dataset.lookupUrl;
+        
+        let debounceTimer = null;
+        let term = '';
+        let page = 1;
+        let request = 0;
+        
+        function hideResults() {
+            resultsEl.style.display = 'none';
+            resultsEl.innerHTML = '';
+        }
+        
+        function selectProduct(product) {
+            hiddenInput.value = product.id;
+            searchInput.value = `${product.name} (${product.sku})`;
+            hideResults();
+            container.dispatchEvent(new CustomEvent('product-selected', { detail: product }));
+        }
+        
+        function loadResults(append) {
+            const current = ++request;
+            const params = new URLSearchParams({ q: term, page: page });
+            
+            fetch(`${lookupUrl}?${params}`, { credentials: 'same-origin' })
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP error! Status: ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(data => {
+                    // Ignore responses to searches the user has already typed past
+                    if (current !== request) return;
+                    
+                    if (!append) {
+                        resultsEl.innerHTML = '';
+                    }
+                    
+                    const moreButton = resultsEl.querySelector('.typeahead-more');
+                    if (moreButton) moreButton.remove();
+                    
+                    data.results.forEach(product => {
+                        const item = document.createElement('button');
+                        item.type = 'button';
+                        item.className = 'list-group-item list-group-item-action d-flex justify-content-between align-items-center';
+                        item.innerHTML = `
+                            <span></span>
+                            <span class="badge bg-secondary"></span>
+                        `;
+                        item.querySelector('span').textContent = `${product.name} (${product.sku})`;
+                        item.querySelector('.badge').textContent = product.quantity;
+                        item.addEventListener('click', () => selectProduct(product));
+                        resultsEl.appendChild(item);
+                    });
+                    
+                    if (data.has_more) {
+                        const more = document.createElement('button');
+                        more.type = 'button';
+                        more.className = 'list-group-item list-group-item-action text-center text-muted typeahead-more';
+                        more.textContent = 'Load more...';
+                        more.addEventListener('click', () => {
+                            page += 1;
+                            loadResults(true);
+                        });
+                        resultsEl.appendChild(more);
+                    }
+                    
+                    if (!resultsEl.children.length) {
+                        resultsEl.innerHTML = '<div class="list-group-item text-muted">No products found</div>';
+                    }
+                    
+                    resultsEl.style.display = 'block';
+                })
+                .catch(error => {
+                    console.error('Error looking up products:', error);
+                });
+        }
+        
+        searchInput.addEventListener('input', function() {
+            // Typing invalidates the previous selection
+            hiddenInput.value = '';
+            
+            clearTimeout(debounceTimer);
+            debounceTimer = setTimeout(() => {
+                term = this.value.trim();
+                page = 1;
+                loadResults(false);
+            }, 200);
+        });
+        
+        searchInput.addEventListener('focus', function() {
+            if (!this.value) {
+                term = '';
+                page = 1;
+                loadResults(false);
+            }
+        });
+        
+        // Close the list when clicking elsewhere
+        document.addEventListener('click', function(e) {
+            if (!container.contains(e.target)) {
+                hideResults();
+            }
+        });
+        
+        searchInput.addEventListener('keydown', function(e) {
+            if (e.key === 'Escape') {
+                hideResults();
+            }
+        });
+    });
+}
@@ -12,6 +12,9 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Initialize charts if needed
     initializeDashboardCharts();
+    
+    // Poll background report job status if needed
+    initializeReportJob();
 });
 
 /**
@@ -62,6 +65,68 @@ function initializeExportButtons() {
             }
         });
     });
+    
+    // Export to CSV button
+    const csvButtons = document.querySelectorAll('.export-csv');
+    csvButtons.forEach(button => {
+        button.addEventListener('click', function(e) {
+            const form = this.closest('form');
+            if (form) {
+                // Set hidden field for report type
+                const reportTypeField = form.querySelector('input[name="report_type"]');
+                if (reportTypeField) {
+                    reportTypeField.value = 'csv';
+                }
+                form.submit();
+            }
+        });
+    });
+}
+
+/**
+ * Poll a background report job until it finishes, then offer the download
+ */
+function initializeReportJob() {
+    const jobEl = document.getElementById('report-job');
+    if (!jobEl) return;
+    
+    const statusUrl = jobEl.dataset.statusUrl;
+    
+    function poll() {
+        fetch(statusUrl, { credentials: 'same-origin' })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP error! Status: ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(data => {
+                const job = data.job;
+                
+                if (job.status === 'done') {
+                    document.getElementById('report-job-running').style.display = 'none';
+                    document.getElementById('report-job-done').style.display = 'block';
+                    
+                    const downloadLink = document.getElementById('report-job-download');
+                    downloadLink.href = job.download_url;
+                    downloadLink.click();
+                } else if (job.status === 'failed') {
+                    document.getElementById('report-job-running').style.display = 'none';
+                    
+                    const failedEl = document.getElementById('report-job-failed');
+                    failedEl.textContent = `Report generation failed: ${job.error || 'unknown error'}`;
+                    failedEl.style.display = 'block';
+                } else {
+                    setTimeout(poll, 2000);
+                }
+            })
+            .catch(error => {
+                console.error('Error checking report status:', error);
+                setTimeout(poll, 5000);
+            });
+    }
+    
+    poll();
 }
 
 /**
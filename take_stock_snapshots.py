@@ -0,0 +1,15 @@
+from app import app
+from services.snapshots import take_snapshots
+import sys
+import time
+
+def snapshot(force=False):
+    with app.app_context():
+        started = time.time()
+        count = take_snapshots(changed_only=not force)
+        
+        print(f"Took {count} stock snapshots in {time.time() - started:.1f}s")
+
+if __name__ == "__main__":
+    # Run nightly (e.g. from cron); --all snapshots unchanged products too
+    snapshot(force='--all' in sys.argv)
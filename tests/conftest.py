@@ -0,0 +1,47 @@
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+import pytest
+
+# The app connects and migrates at import time, so point it at a throwaway
+# file-backed SQLite database before anything imports it
+_tmp = tempfile.mkdtemp(prefix='jockey_wms_tests_')
+atexit.register(shutil.rmtree, _tmp, ignore_errors=True)
+os.environ['DATABASE_TYPE'] = 'sqlite'
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp, 'test.sqlite')}"
+os.environ.setdefault('SESSION_SECRET', 'test')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as flask_app, db  # noqa: E402
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        yield flask_app
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    """A test client logged in as the default admin."""
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'admin', 'password': 'admin123'})
+    return client
+
+@pytest.fixture
+def make_products(app):
+    """Create products named ``<prefix><n>`` and return their ids."""
+    from models import Product
+    
+    def make(prefix, count, quantity=0):
+        products = [
+            Product(name=f'{prefix}{i}', sku=f'{prefix}{i}', quantity=quantity, price_cost=1, price_sell=2)
+            for i in range(count)
+        ]
+        db.session.add_all(products)
+        db.session.commit()
+        return [product.id for product in products]
+    
+    return make
@@ -0,0 +1,57 @@
+import json
+import pytest
+from sqlalchemy import event
+from app import db
+from models import Product, ProductImage
+from services.settings import update_setting
+
+def _add_images(product_ids):
+    """Give every product a featured image and a second one."""
+    for product_id in product_ids:
+        variants = json.dumps({'thumb': f'static/uploads/images/{product_id}_thumb.jpg'})
+        db.session.add(ProductImage(product_id=product_id, image_url=f'static/uploads/images/{product_id}.jpg',
+                                    is_featured=True, variants=variants))
+        db.session.add(ProductImage(product_id=product_id, image_url=f'static/uploads/images/{product_id}_b.jpg'))
+    db.session.commit()
+
+def _count_statements(client, url):
+    """Render ``url`` twice (the first warms caches) and count the second's statements."""
+    assert client.get(url).status_code == 200
+    
+    statements = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    
+    assert response.status_code == 200
+    return len(statements), response.get_data(as_text=True)
+
+@pytest.mark.parametrize('url, quantity', [
+    ('/products/?category=QUERYCOUNT', 50),
+    ('/reports/low-stock?threshold=-1', -5),
+])
+def test_image_lookups_do_not_grow_with_rows(client, make_products, url, quantity):
+    """Rendering a page of products costs the same statements for 5 rows or 40."""
+    update_setting('products_per_page', 100)
+    
+    def add(prefix, count):
+        ids = make_products(prefix, count, quantity=quantity)
+        Product.query.filter(Product.id.in_(ids)).update({'category': 'QUERYCOUNT'}, synchronize_session=False)
+        _add_images(ids)
+        return ids
+    
+    prefix = 'LS' if quantity < 0 else 'PL'
+    few = add(f'{prefix}FEW', 5)
+    small, html = _count_statements(client, url)
+    assert f'{few[0]}_thumb.jpg' in html
+    
+    add(f'{prefix}MANY', 35)
+    large, html = _count_statements(client, url)
+    assert html.count('_thumb.jpg') >= 40
+    
+    assert large == small
@@ -0,0 +1,111 @@
+import threading
+from app import db
+from models import Product, InventoryLog
+from services.stock import record_movement, record_batch, InsufficientStock, DuplicateBatch
+from services.snapshots import take_snapshots, check_consistency
+from services.archive import archive_logs
+
+THREADS = 8
+MOVES_PER_THREAD = 40
+START = 20
+
+def test_concurrent_movements_lose_no_updates(app, make_products):
+    """Many scanners hammering one SKU: no lost updates, no negative stock."""
+    (product_id,) = make_products('STRESS', 1, quantity=START)
+    take_snapshots([product_id], changed_only=False, verify=False)
+    
+    # Per thread: [units in, units out, rejected outs, unexpected errors]
+    counts = [[0, 0, 0, []] for _ in range(THREADS)]
+    barrier = threading.Barrier(THREADS)
+    
+    def scanner(index):
+        totals = counts[index]
+        with app.app_context():
+            barrier.wait()
+            for move in range(MOVES_PER_THREAD):
+                # Takes more out than it puts in, so stock runs dry and outs get rejected
+                action, quantity = ('out', 3) if (move + index) % 2 else ('in', 2)
+                try:
+                    record_movement(product_id, action, quantity, 'stress', None)
+                except InsufficientStock:
+                    totals[2] += 1
+                except Exception as e:
+                    totals[3].append(e)
+                else:
+                    totals[0 if action == 'in' else 1] += quantity
+            db.session.remove()
+    
+    threads = [threading.Thread(target=scanner, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert [error for totals in counts for error in totals[3]] == []
+    units_in = sum(totals[0] for totals in counts)
+    units_out = sum(totals[1] for totals in counts)
+    assert sum(totals[2] for totals in counts) > 0
+    
+    db.session.expire_all()
+    quantity = db.session.get(Product, product_id).quantity
+    assert quantity == START + units_in - units_out
+    assert quantity >= 0
+    
+    # The ledger holds exactly the movements that succeeded and adds up to the quantity
+    logs = InventoryLog.query.filter_by(product_id=product_id).all()
+    assert len(logs) == units_in // 2 + units_out // 3
+    assert sum(-log.quantity if log.action_type == 'out' else log.quantity for log in logs) == quantity - START
+    assert check_consistency([product_id]) == []
+
+def test_snapshots_do_not_hide_drift(app, make_products):
+    """A routine snapshot (here the one archiving takes) keeps a drifted product's baseline."""
+    drifted, steady = make_products('DRIFT', 2, quantity=10)
+    take_snapshots([drifted, steady], verify=False)
+    for product_id in (drifted, steady):
+        record_movement(product_id, 'in', 5, 'drift', None)
+    
+    # Stock changed behind the ledger's back
+    Product.query.filter_by(id=drifted).update({'quantity': 99})
+    db.session.commit()
+    expected = [(drifted, 99, 15)]
+    
+    def mismatches():
+        return [(row['product_id'], row['quantity'], row['expected'])
+                for row in check_consistency([drifted, steady])]
+    
+    assert mismatches() == expected
+    
+    archive_logs(days=0)
+    assert mismatches() == expected
+    assert take_snapshots([drifted, steady], changed_only=False) == 1
+    assert mismatches() == expected
+
+def test_resent_batch_applies_once(app, make_products):
+    """A scan batch sent again with its key, even concurrently, moves stock once."""
+    (product_id,) = make_products('RESEND', 1, quantity=0)
+    line = {'product_id': product_id, 'qty': 3, 'action': 'in', 'reason': 'resend'}
+    outcomes = []
+    barrier = threading.Barrier(THREADS)
+    
+    def send():
+        with app.app_context():
+            barrier.wait()
+            try:
+                record_batch([dict(line)], None, batch_key='resend-key')
+                outcomes.append('applied')
+            except DuplicateBatch:
+                outcomes.append('duplicate')
+            except Exception as e:
+                outcomes.append(e)
+            db.session.remove()
+    
+    threads = [threading.Thread(target=send) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert sorted(outcomes, key=str) == ['applied'] + ['duplicate'] * (THREADS - 1)
+    db.session.expire_all()
+    assert db.session.get(Product, product_id).quantity == 3
+    assert InventoryLog.query.filter_by(product_id=product_id).count() == 1
@@ -1,18 +1,25 @@
 import os
+import csv
 import uuid
+import hashlib
+import numpy as np
 import pandas as pd
 import barcode
 from barcode.writer import ImageWriter
-from io import BytesIO
+from io import BytesIO, StringIO
+from itertools import islice
 from PIL import Image
-from flask import current_app
+from openpyxl import Workbook, load_workbook
+from flask import current_app, Response, stream_with_context
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from datetime import datetime
-from models import Product, ProductAttribute, AttributeDefinition, ProductImage, InventoryLog
+from app import db
+from models import Product
+from services.attributes import attribute_names, attribute_pivot
 
 def generate_sku():
     """Generate a unique SKU."""
@@ -21,6 +28,38 @@ def generate_sku():
     random_string = uuid.uuid4().hex[:4].upper()
     return f"{prefix}-{timestamp}-{random_string}"
 
+def store_upload(file, folder):
+    """Store an upload under its content hash and return the file path.
+    
+    Files are named by the SHA-256 of their bytes, so uploading the same
+    file again reuses the stored copy instead of writing a new one.
+    """
+    extension = file.filename.rsplit('.', 1)[1].lower()
+    if extension == 'jpeg':
+        extension = 'jpg'
+    
+    digest = hashlib.sha256()
+    for block in iter(lambda: file.stream.read(64 * 1024), b''):
+        digest.update(block)
+    file.stream.seek(0)
+    
+    filename = f"{digest.hexdigest()}.{extension}"
+    # Two-character subfolders keep directories small
+    target_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], folder, filename[:2])
+    file_path = os.path.join(target_folder, filename)
+    
+    if os.path.exists(file_path):
+        # Refresh the timestamp so garbage collection treats it as new
+        os.utime(file_path)
+    else:
+        os.makedirs(target_folder, exist_ok=True)
+        # Write to a temporary name first; a concurrent upload of the same file just replaces it
+        temp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+        file.save(temp_path)
+        os.replace(temp_path, file_path)
+    
+    return os.path.join('static', 'uploads', folder, filename[:2], filename)
+
 def save_barcode_image(file):
     """Save an uploaded barcode image and return the file path.
     
@@ -29,21 +68,7 @@ def save_barcode_image(file):
     """
     if file and allowed_file(file.filename):
         try:
-            # Create a unique filename
-            original_ext = file.filename.rsplit('.', 1)[1].lower()
-            filename = f"barcode_{uuid.uuid4().hex}.{original_ext}"
-            
-            # Create upload directory if it doesn't exist
-            upload_folder = current_app.config['UPLOAD_FOLDER']
-            barcode_folder = os.path.join(upload_folder, 'barcodes')
-            os.makedirs(barcode_folder, exist_ok=True)
-            
-            file_path = os.path.join(barcode_folder, filename)
-            
-            # Save the barcode image
-            file.save(file_path)
-            
-            return os.path.join('static', 'uploads', 'barcodes', filename)
+            return store_upload(file, 'barcodes')
         except Exception as e:
             current_app.logger.error(f"Barcode image save error: {e}")
             return None
@@ -55,25 +80,19 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
 def save_image(file):
-    """Save an image and return the file path."""
+    """Save an uploaded image as-is and return the file path.
+    
+    Only the header is read to reject files that are not images; resized
+    variants are built later by the ``image_variants`` job. Identical
+    uploads share one file (see ``store_upload``).
+    """
     if file and allowed_file(file.filename):
         try:
-            # Create a unique filename
-            filename = f"{uuid.uuid4().hex}.{file.filename.rsplit('.', 1)[1].lower()}"
-            
-            # Create upload directory if it doesn't exist
-            upload_folder = current_app.config['UPLOAD_FOLDER']
-            images_folder = os.path.join(upload_folder, 'images')
-            os.makedirs(images_folder, exist_ok=True)
+            # Check it is an image, then store the original untouched
+            Image.open(file.stream).verify()
+            file.stream.seek(0)
             
-            file_path = os.path.join(images_folder, filename)
-            
-            # Resize and save the image
-            img = Image.open(file)
-            img = img.resize((800, 800), Image.LANCZOS)
-            img.save(file_path)
-            
-            return os.path.join('static', 'uploads', 'images', filename)
+            return store_upload(file, 'images')
         except Exception as e:
             current_app.logger.error(f"Image save error: {e}")
             return None
@@ -147,90 +166,334 @@ def generate_inventory_pdf(data, filename):
     
     return os.path.join('static', 'uploads', 'reports', filename)
 
-def export_to_excel(data, filename):
-    """Export data to Excel file."""
+def generate_monthly_pdf(movements, year, month, filename):
+    """Generate PDF report for monthly inventory movements.
+    
+    ``movements`` is the DataFrame returned by ``monthly_movements``.
+    """
+    pdf_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'reports', filename)
+    os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+    
+    doc = SimpleDocTemplate(pdf_path, pagesize=letter)
+    elements = []
+    
+    # Title
+    styles = getSampleStyleSheet()
+    month_name = datetime(int(year), int(month), 1).strftime('%B')
+    elements.append(Paragraph(f"Monthly Inventory Report - {month_name} {year}", styles['Heading1']))
+    elements.append(Spacer(1, 20))
+    
+    # Summary Table
+    data = [['SKU', 'Product Name', 'Category', 'Stock In', 'Stock Out', 'Adjustments', 'Net Change']]
+    
+    columns = ['sku', 'name', 'category', 'stock_in', 'stock_out', 'adjustments', 'net_change']
+    data.extend(movements[columns].values.tolist())
+    
+    # Add totals row
+    totals = ['TOTAL', '', '']
+    totals.extend(int(movements[column].sum()) for column in columns[3:])
+    data.append(totals)
+    
+    # Create and style table
+    table = Table(data)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+    
+    elements.append(table)
+    
+    # Build PDF
+    doc.build(elements)
+    
+    return os.path.join('static', 'uploads', 'reports', filename)
+
+def export_monthly_excel(movements, filename):
+    """Export monthly inventory movements to Excel file.
+    
+    ``movements`` is the DataFrame returned by ``monthly_movements``.
+    """
     excel_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'reports', filename)
     os.makedirs(os.path.dirname(excel_path), exist_ok=True)
     
-    # Convert data to DataFrame
-    records = []
-    for item in data:
-        record = {
-            'SKU': item.sku,
-            'Name': item.name,
-            'Barcode': item.barcode,
-            'Category': item.category,
-            'Size': item.size,
-            'Color': item.color,
-            'Gender': item.gender,
-            'Material': item.material,
-            'Quantity': item.quantity,
-            'Cost Price': item.price_cost,
-            'Selling Price': item.price_sell,
-            'Location': item.location
-        }
+    df = movements.copy()
+    
+    # Add totals row
+    df.loc['TOTAL'] = [
+        'TOTAL',
+        'Total',
+        'All Categories',
+        df['stock_in'].sum(),
+        df['stock_out'].sum(),
+        df['adjustments'].sum(),
+        df['net_change'].sum()
+    ]
+    
+    df.to_excel(excel_path)
+    
+    return os.path.join('static', 'uploads', 'reports', filename)
+
+# Standard export columns as (header, Product attribute) pairs
+EXPORT_COLUMNS = [
+    ('SKU', 'sku'),
+    ('Name', 'name'),
+    ('Barcode', 'barcode'),
+    ('Category', 'category'),
+    ('Size', 'size'),
+    ('Color', 'color'),
+    ('Gender', 'gender'),
+    ('Material', 'material'),
+    ('Quantity', 'quantity'),
+    ('Cost Price', 'price_cost'),
+    ('Selling Price', 'price_sell'),
+    ('Location', 'location')
+]
+
+# Number of products held in memory at once while exporting
+EXPORT_CHUNK_SIZE = 1000
+
+def iter_export_rows(data):
+    """Yield the export header row, then one row per product.
+    
+    ``data`` may be a list of products or a product query. Queries are read
+    with ``yield_per`` so only one chunk of products is in memory at a time.
+    Attribute values are loaded per chunk on a separate connection, which
+    leaves the session's connection free to keep streaming products.
+    """
+    if hasattr(data, 'yield_per'):
+        data = data.yield_per(EXPORT_CHUNK_SIZE)
+    
+    with db.engine.connect() as conn:
+        names = attribute_names(conn)
+        yield [header for header, _ in EXPORT_COLUMNS] + names
         
-        # Add dynamic attributes
-        attribute_defs = AttributeDefinition.query.all()
-        for attr_def in attribute_defs:
-            attr = ProductAttribute.query.filter_by(
-                product_id=item.id, 
-                attribute_id=attr_def.id
-            ).first()
+        products = iter(data)
+        while True:
+            chunk = list(islice(products, EXPORT_CHUNK_SIZE))
+            if not chunk:
+                break
             
-            record[attr_def.name] = attr.value if attr else ""
-        
-        records.append(record)
+            attributes = attribute_pivot([item.id for item in chunk], columns=names, connection=conn)
+            for item, values in zip(chunk, attributes.values.tolist()):
+                yield [getattr(item, field) for _, field in EXPORT_COLUMNS] + values
+
+def export_to_excel(data, filename):
+    """Export data to Excel file.
+    
+    Rows are written with openpyxl's write-only mode, so memory use does not
+    grow with the number of products.
+    """
+    excel_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'reports', filename)
+    os.makedirs(os.path.dirname(excel_path), exist_ok=True)
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
     
-    df = pd.DataFrame(records)
-    df.to_excel(excel_path, index=False)
+    for row in iter_export_rows(data):
+        sheet.append(row)
+    
+    workbook.save(excel_path)
     
     return os.path.join('static', 'uploads', 'reports', filename)
 
-def parse_excel_import(file_path):
-    """Parse Excel file for product import."""
-    try:
-        df = pd.read_excel(file_path)
+def iter_csv_export(data):
+    """Yield CSV text for the export rows, one chunk of products at a time."""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    
+    for count, row in enumerate(iter_export_rows(data)):
+        writer.writerow(row)
         
-        # Convert DataFrame to list of dictionaries
-        records = df.to_dict('records')
+        # Send the header immediately, then one chunk of rows per write
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def stream_csv_export(data, filename):
+    """Return a streaming CSV download response for the export rows."""
+    return Response(
+        stream_with_context(iter_csv_export(data)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+# Standard import columns mapped to product fields
+IMPORT_TEXT_COLUMNS = {
+    'SKU': 'sku',
+    'Name': 'name',
+    'Barcode': 'barcode',
+    'Category': 'category',
+    'Size': 'size',
+    'Color': 'color',
+    'Gender': 'gender',
+    'Material': 'material',
+    'Location': 'location',
+    'Image URL': 'image_url'
+}
+IMPORT_NUMERIC_COLUMNS = {
+    'Cost Price': 'price_cost',
+    'Selling Price': 'price_sell',
+    'Quantity': 'quantity'
+}
+
+def _normalize_import_frame(df):
+    """Turn one chunk of raw import rows into product records.
+    
+    Every column is normalized with pandas column operations. Each record
+    carries its ``row`` number in the file; rows with no SKU or Name, or
+    with a number that does not parse, come back as records with an
+    ``error`` instead, and blank rows are skipped. Blank number cells
+    count as 0. Columns that are not standard become custom attributes.
+    """
+    df = df.rename(columns=str).dropna(how='all')
+    if df.empty:
+        return []
+    
+    errors = pd.Series(None, index=df.index, dtype=object)
+    for column in ('SKU', 'Name'):
+        if column in df:
+            present = df[column].notna() & (df[column].astype(str).str.strip() != '')
+        else:
+            present = pd.Series(False, index=df.index)
+        errors = errors.mask(~present & errors.isna(), 'Missing SKU or Name')
+    
+    numbers = {}
+    for column, field in IMPORT_NUMERIC_COLUMNS.items():
+        if column not in df:
+            numbers[field] = pd.Series(0, index=df.index)
+            continue
         
-        # Process each record to validate and extract data
-        processed_records = []
-        for record in records:
-            # Skip rows with no SKU or Name
-            if not pd.notna(record.get('SKU')) or not pd.notna(record.get('Name')):
-                continue
-            
-            processed_record = {
-                'sku': str(record.get('SKU', '')).strip(),
-                'name': str(record.get('Name', '')).strip(),
-                'barcode': str(record.get('Barcode', '')).strip() if pd.notna(record.get('Barcode')) else None,
-                'category': str(record.get('Category', '')).strip() if pd.notna(record.get('Category')) else None,
-                'size': str(record.get('Size', '')).strip() if pd.notna(record.get('Size')) else None,
-                'color': str(record.get('Color', '')).strip() if pd.notna(record.get('Color')) else None,
-                'gender': str(record.get('Gender', '')).strip() if pd.notna(record.get('Gender')) else None,
-                'material': str(record.get('Material', '')).strip() if pd.notna(record.get('Material')) else None,
-                'price_cost': float(record.get('Cost Price', 0)) if pd.notna(record.get('Cost Price')) else 0,
-                'price_sell': float(record.get('Selling Price', 0)) if pd.notna(record.get('Selling Price')) else 0,
-                'quantity': int(record.get('Quantity', 0)) if pd.notna(record.get('Quantity')) else 0,
-                'location': str(record.get('Location', '')).strip() if pd.notna(record.get('Location')) else None,
-                'image_url': str(record.get('Image URL', '')).strip() if pd.notna(record.get('Image URL')) else None,
-                'attributes': {}
-            }
-            
-            # Extract dynamic attributes (columns that are not standard)
-            standard_columns = ['SKU', 'Name', 'Barcode', 'Category', 'Size', 'Color', 'Gender', 
-                               'Material', 'Quantity', 'Cost Price', 'Selling Price', 'Location', 'Image URL']
-            
-            for col, value in record.items():
-                if col not in standard_columns and pd.notna(value):
-                    processed_record['attributes'][str(col)] = str(value).strip()
-            
-            processed_records.append(processed_record)
+        values = df[column].map(lambda value: value.strip() if isinstance(value, str) else value)
+        blank = values.isna() | (values == '')
+        parsed = pd.to_numeric(values.where(~blank), errors='coerce')
+        invalid = parsed.isna() & ~blank
+        if field == 'quantity':
+            invalid |= parsed.notna() & (parsed % 1 != 0)
+        
+        # Malformed numbers are reported, not imported as 0
+        for row in df.index[invalid & errors.isna()]:
+            errors[row] = f'Invalid {column}: {df.at[row, column]}'
+        numbers[field] = parsed.fillna(0)
+    
+    # Header is row 1, so the first data row (index 0) is row 2
+    failed = errors.notna()
+    bad = df[failed].reindex(columns=['SKU', 'Name']).astype(object)
+    bad = bad.where(bad.notna(), None)
+    rejected = [
+        {'row': row + 2, 'sku': sku, 'name': name, 'error': error}
+        for row, sku, name, error in zip(bad.index, bad['SKU'], bad['Name'], errors[failed])
+    ]
+    
+    df = df[~failed]
+    if df.empty:
+        return rejected
+    
+    out = pd.DataFrame(index=df.index)
+    out['row'] = df.index + 2
+    
+    for column, field in IMPORT_TEXT_COLUMNS.items():
+        if column in df:
+            values = df[column]
+            text = np.where(values.notna(), values.astype(str).str.strip(), None)
+            out[field] = pd.Series(text, index=df.index, dtype=object)
+        else:
+            out[field] = None
+    
+    for field, values in numbers.items():
+        values = values[~failed]
+        out[field] = values.astype(int) if field == 'quantity' else values.astype(float)
+    
+    # Dynamic attributes: every non-empty cell outside the standard columns
+    standard_columns = set(IMPORT_TEXT_COLUMNS) | set(IMPORT_NUMERIC_COLUMNS)
+    attribute_columns = [column for column in df.columns if column not in standard_columns]
+    attributes = {}
+    if attribute_columns:
+        cells = df[attribute_columns].melt(ignore_index=False, var_name='column').dropna(subset=['value'])
+        cells['value'] = cells['value'].astype(str).str.strip()
+        for row, column, value in zip(cells.index, cells['column'], cells['value']):
+            attributes.setdefault(row, {})[column] = value
+    
+    records = out.to_dict('records')
+    for row, record in zip(out.index, records):
+        record['row'] = int(record['row'])
+        record['attributes'] = attributes.get(row, {})
+    
+    return records + rejected
+
+def _iter_xlsx_frames(file_path, chunk_size):
+    """Read an .xlsx file in chunks using openpyxl's read-only mode."""
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
         
-        return processed_records
+        columns = [str(c) if c is not None else f'Unnamed: {i}' for i, c in enumerate(header)]
+        start = 0
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            # Number rows from the top of the sheet, like pandas' readers do
+            yield pd.DataFrame(chunk, columns=columns, index=range(start, start + len(chunk)))
+            start += len(chunk)
+    finally:
+        workbook.close()
+
+def iter_import_batches(file_path, chunk_size=1000, start=0):
+    """Parse a product import file and yield batches of product records.
+    
+    Supports .xlsx (openpyxl read-only mode), .csv (chunked reader) and
+    legacy .xls. Only one chunk of rows is held in memory at a time, apart
+    from .xls, which pandas can only read whole.
     
-    except Exception as e:
-        current_app.logger.error(f"Excel import error: {e}")
-        return None
+    One batch, possibly empty, is yielded per chunk of ``chunk_size`` rows,
+    so a batch's position identifies its rows. The first ``start`` chunks
+    are read but not parsed, which lets a resumed import skip them.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    
+    if extension == '.csv':
+        # Keep codes like SKUs and barcodes as text so leading zeros survive
+        frames = pd.read_csv(file_path, dtype=str, chunksize=chunk_size)
+    elif extension == '.xls':
+        df = pd.read_excel(file_path)
+        frames = (df.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size))
+    else:
+        frames = _iter_xlsx_frames(file_path, chunk_size)
+    
+    for position, frame in enumerate(frames):
+        if position >= start:
+            yield _normalize_import_frame(frame)
+
+def count_import_rows(file_path):
+    """Return the number of data rows in a product import file."""
+    extension = os.path.splitext(file_path)[1].lower()
+    
+    if extension == '.csv':
+        with open(file_path, newline='') as f:
+            return max(sum(1 for _ in f) - 1, 0)
+    
+    if extension == '.xls':
+        return len(pd.read_excel(file_path))
+    
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        sheet = workbook.active
+        # max_row comes from the sheet's dimension record when it has one
+        rows = sheet.max_row if sheet.max_row is not None else sum(1 for _ in sheet.iter_rows())
+        return max(rows - 1, 0)
+    finally:
+        workbook.close()